@@ -0,0 +1,73 @@
+import math
+import multiprocessing as mp
+import time
+
+import canvasapi
+
+def probe_agent(agent_str):
+    '''
+    Imports a submission and constructs its AIPlayer. Runs in a pool
+    worker so crashes and slow imports cannot take down the runner.
+    Returns (agent_str, seconds taken, error or None).
+    '''
+    start = time.perf_counter()
+    try:
+        agent = canvasapi.import_agent(agent_str, 1)
+        for attr in ('get_alpha_beta_move', 'get_expectimax_move'):
+            if not callable(getattr(agent, attr, None)):
+                raise Exception('AIPlayer has no method ' + attr)
+    except BaseException as e:
+        return agent_str, time.perf_counter() - start, repr(e)
+    return agent_str, time.perf_counter() - start, None
+
+class AgentRegistry:
+    '''
+    Validates every submission once before the tournament starts and
+    preloads the ones that import cleanly, so matches only construct
+    agents from already imported classes.
+    '''
+    def __init__(self, timeout=10, jobs=None):
+        self.timeout = timeout
+        self.jobs = jobs if jobs and jobs > 1 else mp.cpu_count()
+        self.import_times = {}
+        self.failures = {}
+
+    def validate(self, entrants):
+        '''
+        Takes (name, agent_str) pairs and returns the pairs whose agents
+        imported within the timeout, in the same order. Failures are
+        recorded in self.failures.
+        '''
+        if len(entrants) == 0:
+            return entrants
+
+        pool = mp.Pool(min(self.jobs, len(entrants)))
+        try:
+            pending = [(name, pool.apply_async(probe_agent, (agent_str,))) for name, agent_str in entrants]
+            deadline = time.perf_counter() + self.timeout * math.ceil(len(entrants) / self.jobs)
+            for name, result in pending:
+                try:
+                    _, import_time, error = result.get(max(0, deadline - time.perf_counter()))
+                except mp.TimeoutError:
+                    import_time, error = None, 'Import timed out'
+                self.import_times[name] = import_time
+                if error is not None:
+                    self.failures[name] = error
+        finally:
+            pool.terminate()
+
+        valid = []
+        for name, agent_str in entrants:
+            if name in self.failures:
+                continue
+            try:
+                canvasapi.load_agent_class(agent_str)
+            except BaseException as e:
+                self.failures[name] = repr(e)
+                continue
+            valid.append((name, agent_str))
+
+        for name in self.failures:
+            print('Rejected', name, self.failures[name])
+        print('Import times:', self.import_times)
+        return valid
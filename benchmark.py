@@ -0,0 +1,197 @@
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import events
+from board import BitBoard
+from bracket import Bracket
+from reference_agent import search
+import runner
+from game import Game
+from runner import run_game
+
+AGENTS = {kind: 'benchmark_agents/{}_player.py'.format(kind)
+          for kind in ('random', 'delay', 'greedy', 'crash', 'timeout')}
+# Entrants for the end-to-end runs cycle through this mix, so most games
+# are played out while crashes and timeouts still show up every round.
+E2E_MIX = ['random', 'greedy', 'random', 'delay', 'greedy', 'random', 'crash', 'random', 'timeout']
+
+class ScriptedPlayer:
+    '''Stand-in player so Game can be built without agent processes.'''
+    def __init__(self, player_number):
+        self.player_number = player_number
+        self.type = 'scripted'
+
+def random_games(num_games, seed):
+    rng = random.Random(seed)
+    games = []
+    for _ in range(num_games):
+        bitboard = BitBoard()
+        moves = []
+        player_num = 1
+        while not bitboard.is_full():
+            col = rng.choice([c for c in range(7) if bitboard.can_play(c)])
+            bitboard.play(col, player_num)
+            moves.append(col)
+            if bitboard.is_win(player_num):
+                break
+            player_num = 3 - player_num
+        games.append(moves)
+    return games
+
+def bench_referee(num_games, seed):
+    games = random_games(num_games, seed)
+    num_moves = 0
+    seconds = 0
+    for moves in games:
+        game = Game(ScriptedPlayer(1), ScriptedPlayer(2), 1)
+        start = time.perf_counter()
+        for i, col in enumerate(moves):
+            player_num = i % 2 + 1
+            game.update_board(col, player_num)
+            game.game_completed(player_num)
+        seconds += time.perf_counter() - start
+        game.close()
+        num_moves += len(moves)
+    return {'games': num_games, 'moves': num_moves, 'seconds': seconds,
+            'games_per_sec': num_games / seconds, 'moves_per_sec': num_moves / seconds}
+
+def bench_search(num_positions, depth, seed):
+    '''Times the reference agent's search on positions taken from random games.'''
+    rng = random.Random(seed)
+    num_nodes = 0
+    seconds = 0
+    for moves in random_games(num_positions, seed):
+        position, mask = 0, 0
+        for col in moves[:rng.randrange(len(moves) // 2 + 1)]:
+            position, mask = search.play(position, mask, col)
+        searcher = search.Searcher()
+        start = time.perf_counter()
+        searcher.best_move(position, mask, max_depth=depth)
+        seconds += time.perf_counter() - start
+        num_nodes += searcher.nodes
+    return {'positions': num_positions, 'depth': depth, 'nodes': num_nodes, 'seconds': seconds,
+            'nodes_per_sec': num_nodes / seconds}
+
+def coin_flip_game(player1, player2, timeout):
+    return random.choice((1, 2)), random.random(), random.random()
+
+def bench_bracket(size):
+    teams = [('p{}'.format(i), 'p{}'.format(i)) for i in range(size)]
+    start = time.perf_counter()
+    b = Bracket(teams, 1)
+    generated = time.perf_counter()
+    b.evalBracket(coin_flip_game)
+    evaluated = time.perf_counter()
+    b.getPlacings()
+    placed = time.perf_counter()
+    return {'entrants': size, 'generate_seconds': generated - start,
+            'eval_seconds': evaluated - generated, 'placings_seconds': placed - evaluated}
+
+def bench_tournament(size, timeout, jobs):
+    kinds = itertools.islice(itertools.cycle(E2E_MIX), size)
+    teams = [('{}-{}'.format(kind, i), AGENTS[kind]) for i, kind in enumerate(kinds)]
+    with tempfile.TemporaryDirectory() as tmp:
+        log = os.path.join(tmp, 'events.jsonl')
+        events.configure(log)
+        try:
+            start = time.perf_counter()
+            b = Bracket(teams, timeout)
+            b.evalBracket(run_game, jobs)
+            b.getPlacings()
+            seconds = time.perf_counter() - start
+        finally:
+            events.configure(None)
+        records = events.read(log) if os.path.exists(log) else []
+    num_games = sum(1 for r in records if r['event'] == 'game')
+    num_moves = sum(1 for r in records if r['event'] == 'move')
+    return {'entrants': size, 'timeout': timeout, 'jobs': jobs, 'games': num_games,
+            'moves': num_moves, 'seconds': seconds,
+            'games_per_sec': num_games / seconds, 'moves_per_sec': num_moves / seconds}
+
+def bench_main(size, timeout, jobs):
+    '''
+    Times a whole runner.main run, with agent validation, qualification,
+    the match cache, the journal and the replay archive, on a temporary
+    submissions folder with the same entrant mix as bench_tournament.
+    Nothing is uploaded; storage is a temporary directory.
+    '''
+    kinds = itertools.islice(itertools.cycle(E2E_MIX), size)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, kind in enumerate(kinds):
+            # Folder names are unique per size since imported agents stay
+            # in sys.modules between runs.
+            folder = os.path.join(tmp, 'submissions', '{}{}_{}'.format(kind, size, i))
+            os.makedirs(folder)
+            shutil.copy(os.path.join(cwd, AGENTS[kind]), os.path.join(folder, 'Player.py'))
+        log = os.path.join(tmp, 'events.jsonl')
+        os.chdir(tmp)
+        sys.path.insert(0, tmp)
+        try:
+            start = time.perf_counter()
+            runner.main('bench', timeout, True, jobs, eventlog=log, storagedir=os.path.join(tmp, 'storage'))
+            seconds = time.perf_counter() - start
+        finally:
+            sys.path.remove(tmp)
+            os.chdir(cwd)
+            events.configure(None)
+        records = events.read(log) if os.path.exists(log) else []
+    num_games = sum(1 for r in records if r['event'] == 'game')
+    return {'entrants': size, 'timeout': timeout, 'jobs': jobs, 'games': num_games, 'seconds': seconds,
+            'games_per_sec': num_games / seconds}
+
+def run(sizes, timeout, jobs, referee_games, seed):
+    random.seed(seed)
+    results = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        results['referee'] = bench_referee(referee_games, seed)
+        results['search'] = bench_search(20, 6, seed)
+        for size in sorted(set(sizes) | {4096}):
+            results['bracket_{}'.format(size)] = bench_bracket(size)
+        for size in sizes:
+            results['tournament_{}'.format(size)] = bench_tournament(size, timeout, jobs)
+            results['main_{}'.format(size)] = bench_main(size, timeout, jobs)
+    return results
+
+def compare(old, new):
+    '''Prints how each timing and throughput changed against an older run.'''
+    for name, metrics in new.items():
+        for metric, value in metrics.items():
+            previous = old.get(name, {}).get(metric)
+            if not (metric.endswith('seconds') or metric.endswith('per_sec')) or not previous:
+                continue
+            print('{:<18} {:<18} {:>12.4f} -> {:>12.4f} ({:+.1f}%)'.format(
+                name, metric, previous, value, 100 * (value - previous) / previous))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[8, 64, 512],
+                        help='Entrant counts for the end-to-end tournaments')
+    parser.add_argument('--time', type=float, default=0.05,
+                        help='Time to wait for a move in seconds')
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--referee-games', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', default=None,
+                        help='Earlier output file to compare against')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.time, args.jobs, args.referee_games, args.seed)
+    report = {'python': platform.python_version(), 'machine': platform.machine(),
+              'cpus': os.cpu_count(), 'time': time.time(), 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(json.load(f)['results'], results)
@@ -0,0 +1,11 @@
+class AIPlayer:
+    '''Raises on every move.'''
+    def __init__(self, player_number):
+        self.player_number = player_number
+        self.type = 'ai'
+
+    def get_alpha_beta_move(self, board):
+        raise RuntimeError('crash_player always crashes')
+
+    def get_expectimax_move(self, board):
+        return self.get_alpha_beta_move(board)
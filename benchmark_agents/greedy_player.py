@@ -0,0 +1,37 @@
+class AIPlayer:
+    '''
+    Takes a winning column if there is one, blocks the opponent's winning
+    column otherwise, and falls back to the legal column closest to the
+    center.
+    '''
+    def __init__(self, player_number):
+        self.player_number = player_number
+        self.type = 'ai'
+
+    def _wins(self, board, col, player):
+        rows, cols = board.shape
+        empty = [row for row in range(rows) if board[row, col] == 0]
+        row = empty[-1]
+        for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            count = 1
+            for sign in (1, -1):
+                r, c = row + sign * dr, col + sign * dc
+                while 0 <= r < rows and 0 <= c < cols and board[r, c] == player:
+                    count += 1
+                    r, c = r + sign * dr, c + sign * dc
+            if count >= 4:
+                return True
+        return False
+
+    def get_alpha_beta_move(self, board):
+        cols = board.shape[1]
+        legal = sorted((col for col in range(cols) if board[0, col] == 0),
+                       key=lambda col: abs(col - cols // 2))
+        for player in (self.player_number, 3 - self.player_number):
+            for col in legal:
+                if self._wins(board, col, player):
+                    return col
+        return legal[0]
+
+    def get_expectimax_move(self, board):
+        return self.get_alpha_beta_move(board)
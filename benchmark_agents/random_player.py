@@ -0,0 +1,13 @@
+import random
+
+class AIPlayer:
+    '''Plays a random legal column.'''
+    def __init__(self, player_number):
+        self.player_number = player_number
+        self.type = 'ai'
+
+    def get_alpha_beta_move(self, board):
+        return random.choice([col for col in range(board.shape[1]) if board[0, col] == 0])
+
+    def get_expectimax_move(self, board):
+        return self.get_alpha_beta_move(board)
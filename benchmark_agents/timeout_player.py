@@ -0,0 +1,13 @@
+import time
+
+class AIPlayer:
+    '''Never answers within any reasonable move time limit.'''
+    def __init__(self, player_number):
+        self.player_number = player_number
+        self.type = 'ai'
+
+    def get_alpha_beta_move(self, board):
+        time.sleep(3600)
+
+    def get_expectimax_move(self, board):
+        return self.get_alpha_beta_move(board)
@@ -0,0 +1,85 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from cache import GameResult
+
+class BestOf:
+    '''
+    Wraps a game callable such as runner.run_game so a pairing is decided
+    by up to n games instead of one. Colors alternate, so player1 moves
+    first in even numbered games and player2 in odd ones. Games are played
+    concurrently in waves, each wave being the fewest games that could
+    still decide the match, so no game is played once the result is
+    settled. A drawn series is given to the player with less total time,
+    the same as a drawn game. A series with a forfeited game is marked
+    as a forfeit, so it is not cached.
+
+    Called directly the games of a wave run on a process pool, since
+    game starts agent processes itself and forking from threads while
+    other threads are busy can leave the child holding a lock that is
+    never released. play_async plays the waves of a game that has its own
+    play_async, such as an AsyncSupervisor, on that event loop instead.
+    '''
+    def __init__(self, game, n):
+        self.game = game
+        self.n = n
+
+    def _series(self, player1, player2):
+        '''
+        Generator behind both ways of playing a series. Yields each wave as
+        a list of (first, second) pairings, is sent back their results and
+        returns the result of the series.
+        '''
+        needed = self.n // 2 + 1
+        wins = [0, 0]
+        times = [0, 0]
+        played = 0
+        forfeit = None
+        while played < self.n and max(wins) < needed:
+            wave = min(needed - wins[0], needed - wins[1], self.n - played)
+            swaps = [i % 2 == 1 for i in range(played, played + wave)]
+            results = yield [(player2, player1) if swapped else (player1, player2) for swapped in swaps]
+            for swapped, result in zip(swaps, results):
+                forfeit = forfeit or getattr(result, 'forfeit', None)
+                win_index, time1, time2 = result
+                if swapped:
+                    win_index, time1, time2 = 3 - win_index, time2, time1
+                wins[win_index - 1] += 1
+                times[0] += time1
+                times[1] += time2
+            played += wave
+
+        print('Best of', self.n, player1, player2, wins)
+        if wins[0] != wins[1]:
+            winner = 1 if wins[0] > wins[1] else 2
+        else:
+            winner = 2 if times[0] > times[1] else 1
+        return GameResult(winner, times[0], times[1], forfeit)
+
+    def __call__(self, player1, player2, timeout):
+        if player1 is None or player2 is None or self.n <= 1:
+            return self.game(player1, player2, timeout)
+
+        series = self._series(player1, player2)
+        with ProcessPoolExecutor(max_workers=self.n // 2 + 1) as executor:
+            try:
+                pairings = next(series)
+                while True:
+                    futures = [executor.submit(self.game, first, second, timeout) for first, second in pairings]
+                    pairings = series.send([future.result() for future in futures])
+            except StopIteration as done:
+                return done.value
+
+    async def play_async(self, player1, player2, timeout):
+        if player1 is None or player2 is None or self.n <= 1:
+            return await self.game.play_async(player1, player2, timeout)
+
+        series = self._series(player1, player2)
+        try:
+            pairings = next(series)
+            while True:
+                results = await asyncio.gather(*(self.game.play_async(first, second, timeout)
+                                                 for first, second in pairings))
+                pairings = series.send(results)
+        except StopIteration as done:
+            return done.value
@@ -0,0 +1,50 @@
+ROWS = 6
+COLUMNS = 7
+# Each column gets one spare bit on top so shifted lines never wrap
+# into the next column.
+HEIGHT = ROWS + 1
+
+def has_four(mask):
+    '''
+    Returns True if the bitboard mask contains four in a row.
+    Shifts are vertical (1), horizontal (HEIGHT) and both diagonals.
+    '''
+    for shift in (1, HEIGHT, HEIGHT - 1, HEIGHT + 1):
+        m = mask & (mask >> shift)
+        if m & (m >> (2 * shift)):
+            return True
+    return False
+
+class BitBoard:
+    '''
+    Connect 4 position stored as one bitmask per player plus the height
+    of every column. Bit (col * HEIGHT + row) is set when that player has
+    a piece in the given column, counting rows from the bottom.
+    '''
+    def __init__(self):
+        self.masks = [0, 0]
+        self.heights = [0] * COLUMNS
+        self.num_moves = 0
+
+    def can_play(self, col):
+        return 0 <= col < COLUMNS and self.heights[col] < ROWS
+
+    def play(self, col, player_num):
+        '''
+        Drops a piece for player 1 or 2 in col and returns the row it
+        landed in, counting from the bottom.
+        '''
+        if not self.can_play(col):
+            err = 'Invalid move by player {}. Column {}'.format(player_num, col)
+            raise Exception(err)
+        row = self.heights[col]
+        self.masks[player_num - 1] |= 1 << (col * HEIGHT + row)
+        self.heights[col] += 1
+        self.num_moves += 1
+        return row
+
+    def is_win(self, player_num):
+        return has_four(self.masks[player_num - 1])
+
+    def is_full(self):
+        return self.num_moves == ROWS * COLUMNS
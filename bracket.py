@@ -1,155 +1,192 @@
 import math
 import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-class Tree:
-    def __init__(self, l, r, v, a, d):
-        self.left = l
-        self.right = r
-        self.player = v
-        self.agent_str = a
-        self.depth = d
+import events
+
+def timed_game(game, player1, player2, timeout):
+    start = time.perf_counter()
+    result = game(player1, player2, timeout)
+    return result, time.perf_counter() - start
+
+async def timed_game_async(game, player1, player2, timeout):
+    start = time.perf_counter()
+    result = await game.play_async(player1, player2, timeout)
+    return result, time.perf_counter() - start
+
+def play_matches(game, pairings, timeout, executor=None, round_num=None, callback=None):
+    '''
+    Plays game on every (agent_str, agent_str) pairing and returns the
+    results in the same order. With an executor the pairings are played
+    concurrently, each in its own worker process, or all on one event
+    loop when the executor is an AsyncSupervisor. callback, if given, is
+    called with (index, result) as soon as each pairing finishes.
+    '''
+    results = [None] * len(pairings)
+
+    def finish(index, result, duration):
+        a, b = pairings[index]
+        # Byes are decided without playing and would skew the match times.
+        if a is not None and b is not None:
+            events.emit('match', round=round_num, player1=a, player2=b, winner=result[0],
+                        time1=result[1], time2=result[2], duration=duration)
+        results[index] = result
+        if callback is not None:
+            callback(index, result)
+
+    if executor is None:
+        for index, (a, b) in enumerate(pairings):
+            finish(index, *timed_game(game, a, b, timeout))
+    else:
+        run = timed_game_async if getattr(executor, 'runs_coroutines', False) else timed_game
+        futures = {executor.submit(run, game, a, b, timeout): index
+                   for index, (a, b) in enumerate(pairings)}
+        for future in as_completed(futures):
+            finish(futures[future], *future.result())
+    return results
+
+class Slot:
+    '''
+    One position in the bracket: an entrant at the bottom level, or the
+    winner of the match between its two children above it.
+    '''
+    __slots__ = ('player', 'agent_str', 'time')
+
+    def __init__(self, player=None, agent_str=None):
+        self.player = player
+        self.agent_str = agent_str
         self.time = None
-        
-    def get_level_nodes(self, level):
-        if self.depth > level + 1:
-            return []
-        if self.depth == level + 1:
-            return [(self.player, self.time)]
-                
-        return [n for n in self.left.get_level_nodes(level)] + [n for n in self.right.get_level_nodes(level)]
-    
-    def display(self):
-        lines, _, _, _ = self._display_aux()
-        return lines
-
-    def _display_aux(self):
-        """Returns list of strings, width, height, and horizontal coordinate of the root."""
-        # No child.
-        if self.right is None and self.left is None:
-            line = '%s' % ((self.player if self.player else 'Bye') + '/' + (str(self.time) if self.time else 'NA'))
-            width = len(line)
-            height = 1
-            middle = width // 2
-            return [line], width, height, middle
-
-        # Only left child.
-        if self.right is None:
-            lines, n, p, x = self.left._display_aux()
-            s = '%s' % ((self.player if self.player else 'Bye') + '/' + (str(self.time) if self.time else 'NA'))
-            u = len(s)
-            first_line = (x + 1) * ' ' + (n - x - 1) * '_' + s
-            second_line = x * ' ' + '/' + (n - x - 1 + u) * ' '
-            shifted_lines = [line + u * ' ' for line in lines]
-            return [first_line, second_line] + shifted_lines, n + u, p + 2, n + u // 2
-
-        # Only right child.
-        if self.left is None:
-            lines, n, p, x = self.right._display_aux()
-            s = '%s' % ((self.player if self.player else 'Bye') + '/' + (str(self.time) if self.time else 'NA'))
-            u = len(s)
-            first_line = s + x * '_' + (n - x) * ' '
-            second_line = (u + x) * ' ' + '\\' + (n - x - 1) * ' '
-            shifted_lines = [u * ' ' + line for line in lines]
-            return [first_line, second_line] + shifted_lines, n + u, p + 2, u // 2
-
-        # Two children.
-        left, n, p, x = self.left._display_aux()
-        right, m, q, y = self.right._display_aux()
-        s = '%s' % ((self.player if self.player else 'Bye') + '/' + (str(self.time) if self.time else 'NA'))
-        u = len(s)
-        first_line = (x + 1) * ' ' + (n - x - 1) * '_' + s + y * '_' + (m - y) * ' '
-        second_line = x * ' ' + '/' + (n - x - 1 + u + y) * ' ' + '\\' + (m - y - 1) * ' '
-        if p < q:
-            left += [n * ' '] * (q - p)
-        elif q < p:
-            right += [m * ' '] * (p - q)
-        zipped_lines = zip(left, right)
-        lines = [first_line, second_line] + [a + u * ' ' + b for a, b in zipped_lines]
-        return lines, n + m + u, max(p, q) + 2, n + u // 2
-        
-    
+
+    def label(self):
+        return (self.player if self.player else 'Bye') + '/' + (str(self.time) if self.time else 'NA')
+
 
 class Bracket:
     def __init__(self, teams, time):
         self.timeout = time
+        self.teams = list(teams)
         self.numTeams = len(teams)
         self.numRounds = int(math.ceil(math.log(self.numTeams,2)))
         self.totalNumTeams = int(2**math.ceil(math.log(self.numTeams,2)))
         self.numByes = self.totalNumTeams - self.numTeams
         print('numbyes:', self.numByes)
         self.byeEveryN = 0 if self.numByes == 0 else math.floor((2**(self.numRounds - 1)) / self.numByes)
-        self.tree = Tree(None, None, None, None, 1)
+        # Slots are stored heap style: slot 1 is the final and slot i is
+        # decided by the match between slots 2i and 2i+1. Slots at depth d
+        # (the final is depth 1) are range(2**(d-1), 2**d). Slot 0 is unused.
+        self.slots = [Slot() for _ in range(2 * self.totalNumTeams)]
         self.generateBracket(teams)
-        
+
+    def level(self, depth):
+        return range(2 ** (depth - 1), 2 ** depth)
+
     def generateBracket(self, playerlist):
-        r = [self.tree]
+        if self.numRounds == 0:
+            self.slots[1].player, self.slots[1].agent_str = playerlist.pop()
+            return
+
         games_assigned = 0
-        for i in range(self.numRounds):
-            r, games_assigned = self.generateRound(r, playerlist, games_assigned)
-            
-    def generateRound(self, trees, players, games_assigned):
-        next_round = []
-        for tree in trees:
-            if tree.depth == self.numRounds:
-                if self.numByes > 0 and games_assigned % self.byeEveryN == 0:
-                    player = players.pop(0)
-                    tree.left = Tree(None, None, player[0], player[1], tree.depth + 1)
-                    tree.right = Tree(None, None, None, None, tree.depth + 1)
-                    self.numByes -= 1
-                else:
-                    player = players.pop(self.numByes)
-                    tree.left = Tree(None, None, player[0], player[1], tree.depth + 1)
-                    player = players.pop()
-                    tree.right = Tree(None, None, player[0], player[1], tree.depth + 1)
-                games_assigned += 1
+        for i in self.level(self.numRounds):
+            left, right = self.slots[2*i], self.slots[2*i + 1]
+            if self.numByes > 0 and games_assigned % self.byeEveryN == 0:
+                left.player, left.agent_str = playerlist.pop(0)
+                self.numByes -= 1
             else:
-                tree.left = Tree(None, None, None, None, tree.depth + 1)
-                tree.right = Tree(None, None, None, None, tree.depth + 1)
-            next_round.append(tree.left)
-            next_round.append(tree.right)
-        return next_round, games_assigned
-
-    
-    def _evalBracket(self, root, level, game): 
-        if root is None: 
-            return 
-
-        if level > 1: 
-            self._evalBracket(root.left, level-1, game) 
-            self._evalBracket(root.right, level-1, game)
-
-        elif level == 1 : 
-            print(root.left.player, root.right.player)
-            win_index, time1, time2 = game(root.left.agent_str, root.right.agent_str, self.timeout)
-            if win_index == 1:
-                root.player = root.left.player
-                root.agent_str = root.left.agent_str
-#                 root.time = time1
-            elif win_index == 2:
-                root.player = root.right.player
-                root.agent_str = root.right.agent_str
-#                 root.time = time2
+                left.player, left.agent_str = playerlist.pop(self.numByes)
+                right.player, right.agent_str = playerlist.pop()
+            games_assigned += 1
+
+    def _recordResult(self, i, result):
+        root, left, right = self.slots[i], self.slots[2*i], self.slots[2*i + 1]
+        win_index, time1, time2 = result
+        if win_index == 1:
+            root.player = left.player
+            root.agent_str = left.agent_str
+        elif win_index == 2:
+            root.player = right.player
+            root.agent_str = right.agent_str
+        else:
+            raise ValueError('Winner was neither 1 or 2')
+        left.time = time1
+        right.time = time2
+
+    def _evalBracket(self, depth, game, executor=None, journal=None, callback=None):
+        matches = []
+        for i in self.level(depth):
+            if journal is not None and str(i) in journal.results:
+                self._recordResult(i, journal.results[str(i)])
+                if callback is not None:
+                    callback(i)
             else:
-                raise ValueError('Winner was neither 1 or 2')
-            root.left.time = time1
-            root.right.time = time2
-
-    def evalBracket(self, game): 
-        h = self.numRounds
-        for i in reversed(range(1, h+1)): 
-            self._evalBracket(self.tree, i, game)
-            
+                matches.append(i)
+        for i in matches:
+            print(self.slots[2*i].player, self.slots[2*i + 1].player)
+
+        def record(index, result):
+            self._recordResult(matches[index], result)
+            if journal is not None:
+                journal.record(str(matches[index]), result)
+            if callback is not None:
+                callback(matches[index])
+
+        pairings = [(self.slots[2*i].agent_str, self.slots[2*i + 1].agent_str) for i in matches]
+        play_matches(game, pairings, self.timeout, executor, self.numRounds - depth + 1, record)
+
+    def evalBracket(self, game, jobs=1, journal=None, executor=None, callback=None):
+        '''
+        Plays the bracket one round at a time, starting from the deepest
+        level. Matches within a round are independent, so with jobs > 1
+        they run on a pool of processes, or on executor if one is given.
+        Results are written to journal as they finish, and matches
+        already in it are not replayed. callback, if given, is called with
+        the slot index of every match as its result is recorded.
+        '''
+        owned = executor is None and jobs > 1
+        if owned:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+        try:
+            for depth in reversed(range(1, self.numRounds + 1)):
+                self._evalBracket(depth, game, executor, journal, callback)
+        finally:
+            if owned:
+                executor.shutdown()
+
     def getPlacings(self):
-        current_place = 1
         placings = []
-        for i in range(self.numRounds + 1):
-            sorted_level = sorted(self.tree.get_level_nodes(i), key=lambda x: x[1])
-            for player in sorted_level:
-                if player[0] not in placings and player[0] is not None:
-                    placings.append(player[0])
+        placed = set()
+        for depth in range(1, self.numRounds + 2):
+            sorted_level = sorted(self.level(depth), key=lambda i: self.slots[i].time)
+            for i in sorted_level:
+                player = self.slots[i].player
+                if player is not None and player not in placed:
+                    placed.add(player)
+                    placings.append(player)
         return placings
-              
-    
-        
-        
-    
\ No newline at end of file
+
+    def display(self):
+        '''
+        Returns the bracket drawn as ascii lines, root at the top. Each
+        slot is laid out from its children's drawings, so the slots are
+        walked from the last index back to the final.
+        '''
+        aux = [None] * len(self.slots)
+        for i in reversed(range(1, len(self.slots))):
+            s = self.slots[i].label()
+            u = len(s)
+            if 2*i >= len(self.slots):
+                aux[i] = [s], u, 1, u // 2
+                continue
+
+            left, n, p, x = aux[2*i]
+            right, m, q, y = aux[2*i + 1]
+            aux[2*i] = aux[2*i + 1] = None
+            first_line = (x + 1) * ' ' + (n - x - 1) * '_' + s + y * '_' + (m - y) * ' '
+            second_line = x * ' ' + '/' + (n - x - 1 + u + y) * ' ' + '\\' + (m - y - 1) * ' '
+            if p < q:
+                left += [n * ' '] * (q - p)
+            elif q < p:
+                right += [m * ' '] * (p - q)
+            lines = [first_line, second_line] + [a + u * ' ' + b for a, b in zip(left, right)]
+            aux[i] = lines, n + m + u, max(p, q) + 2, n + u // 2
+        return aux[1][0]
@@ -0,0 +1,152 @@
+import html
+import json
+import math
+import os
+import time
+
+def _write(path, text):
+    with open(path + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
+
+def finite(t):
+    '''Times of forfeits and byes are infinite; they are shown and exported as missing.'''
+    return None if t is None or math.isinf(t) else t
+
+def slot_depth(i):
+    '''Depth of slot i in the heap layout of Bracket, the final being depth 1.'''
+    return i.bit_length()
+
+class BracketView:
+    '''
+    Live text rendering of a Bracket, drawn sideways with the first round
+    on the left and the final on the right, one line per slot. Every
+    line is laid out once up front; when a match finishes only the lines
+    of its three slots are rebuilt, so following a whole tournament costs
+    time linear in the number of entrants. With a path the view is
+    rewritten there at most every interval seconds, for staff to watch.
+    '''
+    def __init__(self, bracket, path=None, interval=1.0):
+        self.bracket = bracket
+        self.path = path
+        self.interval = interval
+        self.last_write = 0
+        self.leaf_depth = bracket.numRounds + 1
+        names = [str(name) for name, _ in bracket.teams]
+        self.width = max([len(name) for name in names] + [3]) + 12
+        self.lines = [''] * (len(bracket.slots) - 1)
+        for i in range(1, len(bracket.slots)):
+            self._render(i)
+
+    def row(self, i):
+        '''Line of slot i: its position in an in-order walk of the bracket.'''
+        depth = slot_depth(i)
+        return (2 * (i - 2 ** (depth - 1)) + 1) * 2 ** (self.leaf_depth - depth) - 1
+
+    def label(self, i):
+        slot = self.bracket.slots[i]
+        if slot.player is not None:
+            name = str(slot.player)
+        else:
+            name = 'Bye' if slot_depth(i) == self.leaf_depth else '?'
+        if finite(slot.time) is None:
+            return name
+        return '{} ({:.3f})'.format(name, slot.time)
+
+    def _render(self, i):
+        indent = (self.leaf_depth - slot_depth(i)) * self.width
+        self.lines[self.row(i)] = ' ' * indent + self.label(i)
+
+    def update(self, i):
+        '''Called with the slot index of each match once its result is recorded.'''
+        for j in (i, 2*i, 2*i + 1):
+            if j < len(self.bracket.slots):
+                self._render(j)
+        if self.path is not None and time.time() - self.last_write >= self.interval:
+            self.write()
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+    def write(self):
+        self.last_write = time.time()
+        _write(self.path, self.text())
+
+def games_by_pairing(records):
+    '''Groups the game events of an event log by the unordered pair of agents that played.'''
+    games = {}
+    for record in records:
+        if record['event'] == 'game':
+            games.setdefault(frozenset((record['player1'], record['player2'])), []).append(
+                {'player1': record['player1'], 'player2': record['player2'], 'winner': record['winner'],
+                 'time1': finite(record['time1']), 'time2': finite(record['time2']),
+                 'moves': [{'column': col, 'think': think} for col, think in record.get('history', [])]})
+    return games
+
+def to_tree(bracket, records=()):
+    '''
+    Returns the match tree of bracket as nested dicts, the final at the
+    root. Each match lists the games its two agents played in records,
+    the events of this run, with the column and think time of every
+    move. Games answered from the match cache are not in the log and
+    are left out.
+    '''
+    games = games_by_pairing(records)
+    nodes = [None] * len(bracket.slots)
+    for i in reversed(range(1, len(bracket.slots))):
+        slot = bracket.slots[i]
+        node = {'slot': i, 'player': slot.player, 'agent': slot.agent_str, 'time': finite(slot.time)}
+        if 2*i < len(bracket.slots):
+            left, right = bracket.slots[2*i], bracket.slots[2*i + 1]
+            node['round'] = bracket.numRounds - slot_depth(i) + 1
+            node['games'] = games.get(frozenset((left.agent_str, right.agent_str)), [])
+            node['children'] = [nodes[2*i], nodes[2*i + 1]]
+            nodes[2*i] = nodes[2*i + 1] = None
+        nodes[i] = node
+    return nodes[1]
+
+def export_json(bracket, path, records=()):
+    _write(path, json.dumps(to_tree(bracket, records), indent=1))
+
+def export_html(bracket, path, records=()):
+    '''
+    Writes the match tree as nested lists, the final at the top. Each
+    match can be expanded to show its games move by move.
+    '''
+    games = games_by_pairing(records)
+    parts = ['<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Bracket</title>',
+             '<style>ul{list-style:none;padding-left:1.5em}td{padding:0 .5em}</style></head><body>\n<ul>']
+    # Walked with an explicit stack so deep brackets do not recurse; a
+    # negative entry closes the list items opened for its slot.
+    stack = [1]
+    while stack:
+        i = stack.pop()
+        if i < 0:
+            parts.append('</ul></li>')
+            continue
+        slot = bracket.slots[i]
+        name = str(slot.player) if slot.player is not None else 'Bye'
+        time_str = '' if finite(slot.time) is None else ' ({:.3f}s)'.format(slot.time)
+        parts.append('<li>' + html.escape(name + time_str))
+        if 2*i >= len(bracket.slots):
+            parts.append('</li>')
+            continue
+        left, right = bracket.slots[2*i], bracket.slots[2*i + 1]
+        for n, game in enumerate(games.get(frozenset((left.agent_str, right.agent_str)), [])):
+            parts.append('<details><summary>{}</summary><table><tr><th>move</th><th>column</th><th>think (s)</th></tr>'.format(
+                html.escape('game {}: {} vs {}, winner {}'.format(n + 1, game['player1'], game['player2'], game['winner']))))
+            for m, move in enumerate(game['moves']):
+                think = '' if move['think'] is None else '{:.4f}'.format(move['think'])
+                parts.append('<tr><td>{}</td><td>{}</td><td>{}</td></tr>'.format(m + 1, move['column'], think))
+            parts.append('</table></details>')
+        parts.append('<ul>')
+        stack += [-i, 2*i + 1, 2*i]
+    parts.append('</ul>\n</body></html>\n')
+    _write(path, '\n'.join(parts))
+
+def export(bracket, path, records=()):
+    '''Writes html if path ends in .html, json otherwise.'''
+    if path.endswith('.html') or path.endswith('.htm'):
+        export_html(bracket, path, records)
+    else:
+        export_json(bracket, path, records)
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import time
+
+import events
+
+# Bump when the referee rules change so old results are not reused.
+CACHE_VERSION = 1
+
+class GameResult(tuple):
+    '''
+    (winner, time1, time2) as returned by runner.run_game. forfeit is
+    'timeout' or 'error' when the game was decided by a player failing to
+    load, crashing or running out of time. Such results can depend on how
+    loaded the host was, so they are not cached.
+    '''
+    def __new__(cls, winner, time1, time2, forfeit=None):
+        result = super().__new__(cls, (winner, time1, time2))
+        result.forfeit = forfeit
+        return result
+
+    def __reduce__(self):
+        return GameResult, tuple(self) + (self.forfeit,)
+
+class MatchCache:
+    '''
+    On-disk cache of game results, stored as one small json file per key
+    under path. Keys hash the source of both agents, the move timeout and
+    which agent moves first, so a resubmission never hits a stale entry.
+    Entries older than max_age seconds are ignored, and evict() trims the
+    cache to max_entries, dropping the least recently used first.
+    '''
+    def __init__(self, path='./.matchcache', max_entries=100000, max_age=30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+
+    def key(self, player1, player2, timeout, tag=None):
+        h = hashlib.sha256(str(CACHE_VERSION).encode())
+        for agent_str in (player1, player2):
+            with open(agent_str, 'rb') as f:
+                h.update(hashlib.sha256(f.read()).digest())
+        h.update(str(timeout).encode())
+        if tag is not None:
+            h.update(str(tag).encode())
+        return h.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, key[:2], key + '.json')
+
+    def get(self, key):
+        entry = self._entry(key)
+        try:
+            if time.time() - os.path.getmtime(entry) > self.max_age:
+                return None
+            with open(entry, 'r') as f:
+                result = tuple(json.load(f))
+            # Touch the entry so eviction keeps recently used results.
+            os.utime(entry)
+            return result
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        entry = self._entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = '{}.{}.tmp'.format(entry, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(list(result), f)
+        os.replace(tmp, entry)
+
+    def evict(self):
+        if not os.path.isdir(self.path):
+            return
+        entries = []
+        for folder in os.listdir(self.path):
+            folder = os.path.join(self.path, folder)
+            if os.path.isdir(folder):
+                for name in os.listdir(folder):
+                    entry = os.path.join(folder, name)
+                    entries.append((os.path.getmtime(entry), entry))
+        entries.sort(reverse=True)
+        now = time.time()
+        for i, (mtime, entry) in enumerate(entries):
+            if i >= self.max_entries or now - mtime > self.max_age:
+                os.remove(entry)
+
+class CachedGame:
+    '''
+    Wraps a game callable such as runner.run_game and answers from the
+    cache when both agents and the timeout have been seen before. tag
+    separates results of differently configured games, such as a best of
+    n series or games under sandbox limits, from single games. Results
+    decided by a forfeit are passed on but not cached. play_async does
+    the same for a game that has its own play_async.
+    '''
+    def __init__(self, game, cache, tag=None):
+        self.game = game
+        self.cache = cache
+        self.tag = tag
+
+    def _lookup(self, player1, player2, timeout):
+        '''Returns (key, cached result); key is None when the game cannot be cached.'''
+        if player1 is None or player2 is None:
+            return None, None
+        try:
+            key = self.cache.key(player1, player2, timeout, self.tag)
+        except OSError:
+            return None, None
+        result = self.cache.get(key)
+        if result is not None:
+            print('Cached result:', player1, player2, result)
+            events.emit('cache_hit', player1=player1, player2=player2)
+        return key, result
+
+    def _store(self, key, result):
+        if key is not None and getattr(result, 'forfeit', None) is None:
+            self.cache.put(key, result)
+        return result
+
+    def __call__(self, player1, player2, timeout):
+        key, result = self._lookup(player1, player2, timeout)
+        if result is not None:
+            return result
+        return self._store(key, self.game(player1, player2, timeout))
+
+    async def play_async(self, player1, player2, timeout):
+        key, result = self._lookup(player1, player2, timeout)
+        if result is not None:
+            return result
+        return self._store(key, await self.game.play_async(player1, player2, timeout))
@@ -1,7 +1,26 @@
 import importlib
+import json
 import multiprocessing as mp
+import os
 import requests as r
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+
+CANVAS_URL = 'https://canvas.ucsc.edu'
+
+# AIPlayer classes by path, filled once per process by load_agent_class.
+_agent_classes = {}
+
+def load_agent_class(path):
+    '''
+    Imports a submission once and returns its AIPlayer class. Later calls
+    for the same path are a dict lookup.
+    '''
+    if path not in _agent_classes:
+        player_module = importlib.import_module(path.split(".")[0].replace("/","."))
+        _agent_classes[path] = player_module.AIPlayer
+    return _agent_classes[path]
 
 def import_agent(path, player_num):
     '''
@@ -10,11 +29,60 @@ def import_agent(path, player_num):
         Note the .py at the end.
         
     '''
-    player_module = importlib.import_module(path.split(".")[0].replace("/","."))
-    agent = player_module.AIPlayer(player_num)
+    agent = load_agent_class(path)(player_num)
     return agent
 
-def get_submissions(course_num, assignment_num, api_token, dest_path="./submissions"):
+def make_session(api_token, pool_size=16):
+    '''
+    Returns a requests session that reuses connections to canvas and
+    sends the api token with every request.
+    '''
+    session = r.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({"Authorization":f'Bearer {api_token}'})
+    return session
+
+def get_paginated(session, url):
+    '''
+    Follows the Link: rel="next" headers canvas sends and returns the
+    items of every page.
+    '''
+    items = []
+    while url:
+        resp = session.get(url)
+        resp.raise_for_status()
+        items.extend(resp.json())
+        url = resp.links.get('next', {}).get('url')
+    return items
+
+def download_attachment(session, attachment, path, chunk_size=1 << 16):
+    '''
+    Streams an attachment to path in chunks and removes any other file in
+    the folder, so a resubmission under a new name replaces the old one.
+    Directories such as __pycache__ are left alone.
+    '''
+    part = path.with_name(path.name + '.part')
+    with session.get(attachment["url"], stream=True) as resp:
+        resp.raise_for_status()
+        with open(part, 'wb') as f:
+            for chunk in resp.iter_content(chunk_size):
+                f.write(chunk)
+    os.replace(part, path)
+    for old in path.parent.iterdir():
+        if old != path and old.is_file():
+            old.unlink()
+
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def get_submissions(course_num, assignment_num, api_token, dest_path="./submissions",
+                    base_url=CANVAS_URL, workers=8):
     '''
     takes in course/assignment number and canvas api token
         stores them in the following directory structure:
@@ -26,29 +94,59 @@ def get_submissions(course_num, assignment_num, api_token, dest_path="./submissi
                 |-student3/
                     |-<submitted file>
                 ...
+    Attachments are downloaded concurrently on workers threads. The size
+    and updated_at of every download is kept in <dest_path>.manifest.json
+    and files that have not changed since the last fetch are skipped.
+    A failed download does not stop the others; returns a dict of the
+    users whose submission could not be downloaded, with the error.
     '''
     
-    users_url = f'https://canvas.ucsc.edu/api/v1/courses/{course_num}/users?per_page=100'
-    submissions_url = f'https://canvas.ucsc.edu/api/v1/courses/{course_num}/assignments/{assignment_num}/submissions?per_page=100'
-    headers = {"Authorization":f'Bearer {api_token}'}
-    resp_users = r.get(users_url, headers=headers)
-    user_dict = {x["id"]:x["email"] for x in resp_users.json()}
-    resp_sub = r.get(submissions_url, headers=headers)
-    for item in resp_sub.json():
-        try:
-            if item["missing"] or item["user_id"] not in user_dict.keys() or 'attachments' not in item.keys():
-                continue
-            user = user_dict[item["user_id"]].split("@")[0]
-            path = Path(f'{dest_path}/{user}')
-            path.mkdir(parents=True, exist_ok=True)            
-            attachmentlist = item['attachments']
-            if len(attachmentlist) > 1 or len(attachmentlist) == 0:
-                continue
-            attachment = attachmentlist[0]
-            resp = r.get(attachment["url"], headers=headers)
-            with open(path / attachment["filename"], 'wb') as f:
-                f.write(resp.content)
-        except Exception as e:
-            print(e)
-            raise e
+    users_url = f'{base_url}/api/v1/courses/{course_num}/users?per_page=100'
+    submissions_url = f'{base_url}/api/v1/courses/{course_num}/assignments/{assignment_num}/submissions?per_page=100'
+    manifest_path = f'{dest_path}.manifest.json'
+    manifest = load_manifest(manifest_path)
+    session = make_session(api_token, workers)
+    user_dict = {x["id"]:x["email"] for x in get_paginated(session, users_url)}
+
+    downloads = []
+    for item in get_paginated(session, submissions_url):
+        if item["missing"] or item["user_id"] not in user_dict.keys() or 'attachments' not in item.keys():
+            continue
+        user = user_dict[item["user_id"]].split("@")[0]
+        path = Path(f'{dest_path}/{user}')
+        path.mkdir(parents=True, exist_ok=True)
+        attachmentlist = item['attachments']
+        if len(attachmentlist) > 1 or len(attachmentlist) == 0:
+            continue
+        attachment = attachmentlist[0]
+        entry = {"filename": attachment["filename"],
+                 "size": attachment.get("size"),
+                 "updated_at": attachment.get("updated_at")}
+        filepath = path / attachment["filename"]
+        if (manifest.get(user) == entry and filepath.exists()
+                and (entry["size"] is None or filepath.stat().st_size == entry["size"])):
+            continue
+        downloads.append((user, entry, attachment, filepath))
 
+    failures = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(download_attachment, session, attachment, filepath): (user, entry)
+                       for user, entry, attachment, filepath in downloads}
+            for future in as_completed(futures):
+                user, entry = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print('Failed to download submission of', user, e)
+                    failures[user] = str(e)
+                    continue
+                manifest[user] = entry
+    finally:
+        # Written even if the fetch is interrupted, so files already
+        # downloaded are skipped next time.
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+    print(f'Downloaded {len(downloads) - len(failures)} submissions, {len(failures)} failed')
+    return failures
@@ -0,0 +1,112 @@
+import json
+import os
+import sys
+import time
+import uuid
+
+# Pool and agent processes pick the log path up from the environment, so
+# it only has to be configured once in the runner.
+ENV_VAR = 'CODETOURNAMENT_EVENTS'
+# Every event carries the id of the run that wrote it, since one log can
+# collect many runs.
+RUN_VAR = 'CODETOURNAMENT_RUN'
+
+def configure(path):
+    '''Starts logging to path for a new run, or stops logging when path is None.'''
+    if path is None:
+        os.environ.pop(ENV_VAR, None)
+        os.environ.pop(RUN_VAR, None)
+    else:
+        os.environ[ENV_VAR] = os.path.abspath(path)
+        os.environ[RUN_VAR] = uuid.uuid4().hex
+
+def run_id():
+    return os.environ.get(RUN_VAR)
+
+def emit(event, **fields):
+    '''
+    Appends one event as a json line to the configured log. Does nothing
+    when no log is configured. Each event is a single small write, so
+    processes sharing the log do not interleave lines.
+    '''
+    path = os.environ.get(ENV_VAR)
+    if path is None:
+        return
+    record = {'event': event, 'ts': time.time(), 'pid': os.getpid(), 'run': os.environ.get(RUN_VAR)}
+    record.update(fields)
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+def read(path, run=None):
+    '''Returns the events in the log at path, only those of run if given.'''
+    with open(path, 'r') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if run is not None:
+        records = [record for record in records if record.get('run') == run]
+    return records
+
+def percentiles(values, points=(50, 90, 99)):
+    values = sorted(values)
+    if len(values) == 0:
+        return {}
+    stats = {'p{}'.format(p): values[min(len(values) - 1, int(len(values) * p / 100))] for p in points}
+    stats['max'] = values[-1]
+    stats['n'] = len(values)
+    return stats
+
+def summarize(records):
+    '''
+    Returns latency percentiles per agent (think time, cpu time,
+    supervisor overhead, referee time, peak rss, timeouts and errors) and
+    per round (match wall time).
+    '''
+    agents = {}
+    rounds = {}
+    for record in records:
+        if record['event'] in ('move', 'timeout', 'error'):
+            agent = agents.setdefault(record['agent'], {'think': [], 'cpu': [], 'overhead': [], 'referee': [],
+                                                         'rss': 0, 'timeouts': 0, 'errors': 0})
+            if record['event'] == 'move':
+                agent['think'].append(record['think'])
+                agent['cpu'].append(record.get('cpu', 0))
+                agent['overhead'].append(record['overhead'])
+                agent['referee'].append(record['referee'])
+                agent['rss'] = max(agent['rss'], record['rss'])
+            elif record['event'] == 'timeout':
+                agent['timeouts'] += 1
+            else:
+                agent['errors'] += 1
+        elif record['event'] == 'match':
+            rounds.setdefault(record['round'], []).append(record['duration'])
+
+    summary = {'agents': {}, 'rounds': {}}
+    for name, agent in agents.items():
+        summary['agents'][name] = {'think': percentiles(agent['think']),
+                                   'cpu': percentiles(agent['cpu']),
+                                   'overhead': percentiles(agent['overhead']),
+                                   'referee': percentiles(agent['referee']),
+                                   'peak_rss_kb': agent['rss'],
+                                   'timeouts': agent['timeouts'],
+                                   'errors': agent['errors']}
+    for round_num, durations in rounds.items():
+        summary['rounds'][str(round_num)] = {'match_time': percentiles(durations)}
+    return summary
+
+def print_summary(summary):
+    print('agent', 'think p50/p90/p99/max', 'cpu p50/p99', 'overhead p50/p99', 'peak rss kb', 'timeouts', 'errors',
+          sep='\t')
+    for name, agent in sorted(summary['agents'].items(), key=lambda a: -a[1]['think'].get('p90', 0)):
+        think, cpu, overhead = agent['think'], agent['cpu'], agent['overhead']
+        print(name,
+              '/'.join('{:.4f}'.format(think.get(p, 0)) for p in ('p50', 'p90', 'p99', 'max')),
+              '/'.join('{:.4f}'.format(cpu.get(p, 0)) for p in ('p50', 'p99')),
+              '/'.join('{:.4f}'.format(overhead.get(p, 0)) for p in ('p50', 'p99')),
+              agent['peak_rss_kb'], agent['timeouts'], agent['errors'], sep='\t')
+    print('round', 'matches', 'match time p50/p90/max', sep='\t')
+    for round_num, stats in sorted(summary['rounds'].items(), key=lambda r: (len(r[0]), r[0])):
+        match_time = stats['match_time']
+        print(round_num, match_time['n'],
+              '/'.join('{:.3f}'.format(match_time[p]) for p in ('p50', 'p90', 'max')), sep='\t')
+
+if __name__ == '__main__':
+    print_summary(summarize(read(sys.argv[1])))
@@ -0,0 +1,312 @@
+# system libs
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import time
+import resource
+
+# 3rd party libs
+import numpy as np
+
+# Local libs
+import canvasapi
+from cache import GameResult
+from board import BitBoard, ROWS, COLUMNS
+import events
+import replay
+import sandbox
+
+def agent_worker(agent, conn, board_name, limits=None):
+    '''
+    Long-lived loop run in an agent's process. The game board lives in
+    the shared memory block board_name, which the worker only reads. Each
+    request is just the name of the move function; the agent is handed a
+    private copy of the board so it can modify it freely. Replies with the
+    move, the wall time it took, the peak rss of the process in kilobytes
+    and the cpu time it took. The process runs under the sandbox limits.
+    A None request shuts the worker down.
+    '''
+    shm = shared_memory.SharedMemory(name=board_name)
+    shared_board = np.ndarray((ROWS, COLUMNS), dtype=np.uint8, buffer=shm.buf)
+    shared_board.flags.writeable = False
+    sandbox.apply_limits(limits)
+    while True:
+        try:
+            func_name = conn.recv()
+        except EOFError:
+            break
+        if func_name is None:
+            break
+        try:
+            sandbox.start_move(limits)
+            board = shared_board.copy()
+            cpu_start = sandbox.cpu_time()
+            start = time.perf_counter()
+            move = getattr(agent, func_name)(board)
+            end = time.perf_counter()
+            cputime = sandbox.cpu_time() - cpu_start
+            conn.send((move, end - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, cputime))
+        except:
+            conn.send((None, -1, 0, 0))
+    del shared_board
+    shm.close()
+
+
+class TurnTimeout(Exception):
+    pass
+
+
+class AgentWorker:
+    '''
+    Supervises one agent process for the length of a game. The process is
+    only replaced when a move times out or the agent crashes. context is
+    the multiprocessing context the process is started from, by default
+    the one for the platform's default start method.
+    '''
+    def __init__(self, agent, board_name, limits=None, context=None):
+        self.agent = agent
+        self.board_name = board_name
+        self.limits = limits
+        self.context = context or mp.get_context()
+        self.process = None
+        self.conn = None
+
+    def start(self):
+        start = time.perf_counter()
+        self.conn, child_end = self.context.Pipe()
+        self.process = self.context.Process(target=agent_worker, args=(self.agent, child_end, self.board_name, self.limits),
+                                  daemon=True)
+        self.process.start()
+        child_end.close()
+        events.emit('worker_start', player=self.agent.player_number, duration=time.perf_counter() - start)
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(0.1)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def kill(self):
+        '''Kills the process at once, for an agent that is past its deadline. stop still has to be called.'''
+        if self.process is not None:
+            self.process.kill()
+
+    def needs_restart(self):
+        return self.process is None or not self.process.is_alive()
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def send(self, func_name):
+        if self.needs_restart():
+            self.restart()
+        self.conn.send(func_name)
+
+    def receive(self):
+        try:
+            move, turntime, rss, cputime = self.conn.recv()
+        except EOFError:
+            # The dead process is cleaned up by the next restart or stop.
+            raise Exception('Player process exited')
+        if turntime < 0:
+            raise Exception('Player raised an exception')
+        return move, turntime, rss, cputime
+
+    def get_move(self, func_name, timeout):
+        self.send(func_name)
+        if not self.conn.poll(timeout):
+            self.kill()
+            self.stop()
+            raise TurnTimeout('Player Exceeded time limit')
+        return self.receive()
+
+
+class Game:
+    def __init__(self, player1, player2, timeout, names=None, limits=None, context=None):
+        self.players = [player1, player2]
+        self.names = names if names is not None else [1, 2]
+        self.colors = ['yellow', 'red']
+        self.current_turn = 0
+        self.bitboard = BitBoard()
+        # Agent workers read the board straight from shared memory, so
+        # nothing is copied or pickled to hand it over each move.
+        self.shm = shared_memory.SharedMemory(create=True, size=ROWS * COLUMNS)
+        self.board = np.ndarray((ROWS, COLUMNS), dtype=np.uint8, buffer=self.shm.buf)
+        self.board[:] = 0
+        self.gui_board = []
+        self.game_over = False
+        self.ai_turn_limit = timeout
+        self.winner = 0
+        # (player_number, 'timeout' or 'error', message) once a player forfeits
+        self.error = None
+        self.totaltimes = [0, 0]
+        self.cputimes = [0, 0]
+        # (column, think time) of every move played, in order; the column
+        # is None when the player passed
+        self.moves = []
+        self.workers = [AgentWorker(p, self.shm.name, limits, context) if p.type == 'ai' else None
+                        for p in self.players]
+        for worker in self.workers:
+            if worker is not None:
+                worker.start()
+
+    def close(self):
+        for worker in self.workers:
+            if worker is not None:
+                worker.stop()
+        if self.shm is not None:
+            self.board = self.board.copy()
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def move_function(self):
+        '''
+        Returns the name of the move function the current AI player should
+        use, or None if the current player moves in process.
+        '''
+        if self.players[self.current_turn].type != 'ai':
+            return None
+        if self.players[int(not self.current_turn)].type == 'random':
+            return 'get_expectimax_move'
+        return 'get_alpha_beta_move'
+
+    def check_tie(self):
+        if self.bitboard.is_full() and self.winner == 0:
+            self.winner = 2 if self.totaltimes[0] > self.totaltimes[1] else 1
+            self.game_over = True
+        return self.game_over
+
+    def make_move(self):
+        if not self.game_over:
+            current_player = self.players[self.current_turn]
+            p_func = self.move_function()
+            if p_func is not None:
+                start = time.perf_counter()
+                try:
+                    worker = self.workers[self.current_turn]
+                    move, turntime, rss, cputime = worker.get_move(p_func, self.ai_turn_limit)
+                except Exception as e:
+                    self.forfeit(e, start)
+                    return
+                self.apply_move(move, turntime, rss, start, cputime)
+            else:
+                self.apply_move(current_player.get_move(self.board))
+
+    def forfeit(self, e, start):
+        current_player = self.players[self.current_turn]
+        uh_oh = 'Uh oh.... something is wrong with Player {}'
+        print(uh_oh.format(current_player.player_number))
+        print(e)
+        kind = 'timeout' if type(e) is TurnTimeout else 'error'
+        events.emit(kind,
+                    agent=self.names[self.current_turn],
+                    player=current_player.player_number,
+                    wall=time.perf_counter() - start,
+                    error=str(e))
+        
+        self.error = (current_player.player_number, kind, str(e))
+        self.winner = 3 - current_player.player_number
+        self.game_over = True
+        # raise Exception('Game Over')
+
+    def apply_move(self, move, turntime=None, rss=None, start=None, cputime=None):
+        '''
+        Plays move for the current player and checks for a win. turntime,
+        rss, start and cputime are given for AI moves and go to the event
+        log.
+        '''
+        current_player = self.players[self.current_turn]
+        if turntime is not None:
+            print(current_player.player_number, turntime)
+            self.totaltimes[self.current_turn] += turntime
+            self.cputimes[self.current_turn] += cputime
+            # print('Turn time:', end - start)
+
+        referee_start = time.perf_counter()
+        if move is not None:
+            try:
+                self.update_board(int(move), current_player.player_number)
+            except Exception as e:
+                print ('Error updating board. Most likely move is invalid. Player ', current_player.player_number)
+                print (e)
+                events.emit('error',
+                            agent=self.names[self.current_turn],
+                            player=current_player.player_number,
+                            error=str(e))
+                self.error = (current_player.player_number, 'error', str(e))
+                self.winner = 3 - current_player.player_number
+                self.game_over = True
+                return
+        # A None move passes the turn and is kept as a column of None.
+        self.moves.append((None if move is None else int(move), turntime))
+
+        completed = self.game_completed(current_player.player_number)
+        if turntime is not None:
+            referee_end = time.perf_counter()
+            events.emit('move',
+                        agent=self.names[self.current_turn],
+                        player=current_player.player_number,
+                        think=turntime,
+                        cpu=cputime,
+                        overhead=referee_start - start - turntime,
+                        referee=referee_end - referee_start,
+                        rss=rss)
+
+        if completed:
+            self.winner = current_player.player_number
+            self.game_over = True
+            # self.player_string.configure(text=self.players[self.current_turn].player_string + ' wins!')
+        else:
+            self.current_turn = int(not self.current_turn)
+            # self.player_string.configure(text=self.players[self.current_turn].player_string)
+
+    def update_board(self, move, player_num):
+        row = self.bitboard.play(move, player_num)
+        self.board[self.board.shape[0] - 1 - row, move] = player_num
+        # self.c.itemconfig(self.gui_board[move][update_row],
+        #                   fill=self.colors[self.current_turn])
+
+    def game_completed(self, player_num):
+        return self.bitboard.is_win(player_num)
+
+def setup_game(player1, player2, timeout, limits=None, context=None):
+    '''
+    Returns (game, None) ready to play, or (None, result) when a player is
+    a bye or fails to load and the game is decided without playing.
+    '''
+    if (player1 is None):
+        return None, (2, float('inf'), 0)
+    elif (player2 is None):
+        return None, (1, 0, float('inf'))
+    try:
+        p1 = canvasapi.import_agent(player1, 1)
+    except Exception as e:
+        print (e, player1)
+        return None, GameResult(2, float('inf'), 0, 'error')
+    try:    
+        p2 = canvasapi.import_agent(player2, 2)
+    except Exception as e:
+        print (e, player2)
+        return None, GameResult(1, 0, float('inf'), 'error')
+    return Game(p1, p2, timeout, [player1, player2], limits, context), None
+
+def game_result(game, player1, player2, start):
+    print(game.totaltimes[0], game.totaltimes[1])
+    events.emit('game', player1=player1, player2=player2, winner=game.winner,
+                time1=game.totaltimes[0], time2=game.totaltimes[1],
+                cpu1=game.cputimes[0], cpu2=game.cputimes[1],
+                moves=game.bitboard.num_moves, history=game.moves, duration=time.perf_counter() - start)
+    replay.record(game, player1, player2)
+    forfeit = game.error[1] if game.error is not None else None
+    return GameResult(game.winner, game.totaltimes[0], game.totaltimes[1], forfeit)
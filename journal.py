@@ -0,0 +1,101 @@
+import json
+import os
+import time
+
+class Journal:
+    '''
+    Append-only record of finished games so an interrupted tournament can
+    be resumed. The first line is a header describing the tournament,
+    every further line is one result. Each line is fsynced before the
+    next game is recorded. mirror (if given) is called with the whole
+    journal text so it can be copied off the machine, at most every
+    mirror_interval seconds while games are recorded and once more on
+    close().
+    '''
+    def __init__(self, path, mirror=None, mirror_interval=60):
+        self.path = path
+        self.mirror = mirror
+        self.mirror_interval = mirror_interval
+        self.last_mirror = 0
+        self.pending = False
+        self.results = {}
+
+    def _read_lines(self):
+        '''
+        Returns the parsed lines of the journal. A run killed mid-write
+        leaves a partial last line; it is dropped and cut from the file.
+        '''
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        lines = data.split(b'\n')
+        parsed = []
+        for n, line in enumerate(lines):
+            if not line.strip():
+                continue
+            try:
+                parsed.append(json.loads(line))
+            except ValueError:
+                if any(rest.strip() for rest in lines[n + 1:]):
+                    raise
+                print('Dropping partial last line of', self.path)
+                with open(self.path, 'r+b') as f:
+                    f.truncate(len(b'\n'.join(lines[:n])) + (1 if n else 0))
+                break
+        return parsed
+
+    def header(self):
+        '''Returns the header of the journal on disk, or None if there is none.'''
+        if not os.path.exists(self.path):
+            return None
+        lines = self._read_lines()
+        return lines[0] if lines else None
+
+    def start(self, header, resume=False):
+        '''
+        Opens the journal for a tournament described by header. With
+        resume=True and a journal on disk, its results are loaded into
+        self.results; a journal for a different tournament is left as it
+        is and ValueError is raised, so no recorded result is lost.
+        Otherwise a new journal is started.
+        '''
+        header = json.loads(json.dumps(header))
+        if resume and os.path.exists(self.path):
+            lines = self._read_lines()
+            if lines and lines[0] == header:
+                self.results = {line['key']: tuple(line['result']) for line in lines[1:]}
+                print('Resuming with', len(self.results), 'results from', self.path)
+                return
+            if lines:
+                raise ValueError('Journal {} is for a different tournament; move it away or run '
+                                 'without --resume to start over'.format(self.path))
+
+        self.results = {}
+        with open(self.path, 'w') as f:
+            f.write(json.dumps(header) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._mirror(force=True)
+
+    def record(self, key, result):
+        self.results[key] = tuple(result)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'key': key, 'result': list(result)}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._mirror()
+
+    def close(self):
+        '''Mirrors any results recorded since the last upload.'''
+        if self.pending:
+            self._mirror(force=True)
+
+    def _mirror(self, force=False):
+        if self.mirror is None:
+            return
+        if not force and time.time() - self.last_mirror < self.mirror_interval:
+            self.pending = True
+            return
+        self.pending = False
+        self.last_mirror = time.time()
+        with open(self.path, 'r') as f:
+            self.mirror(f.read())
@@ -0,0 +1,73 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import canvasapi
+from game import setup_game
+
+REFERENCE_OPPONENT = 'reference_agent/Player.py'
+
+def qualify_agent(agent_str, opponent, timeout, moves, limits=None):
+    '''
+    Plays the first few moves of a game as each color against opponent.
+    Returns None if the agent made all its moves legally and in time,
+    otherwise ('timeout' or 'error', message).
+    '''
+    for color in (1, 2):
+        players = (agent_str, opponent) if color == 1 else (opponent, agent_str)
+        game, result = setup_game(players[0], players[1], timeout, limits)
+        if game is None:
+            return 'error', 'Failed to load'
+        try:
+            while not game.game_over and game.bitboard.num_moves < 2 * moves:
+                if game.check_tie():
+                    break
+                game.make_move()
+        finally:
+            game.close()
+        if game.error is not None and game.error[0] == color:
+            return game.error[1], game.error[2]
+    return None
+
+class Qualifier:
+    '''
+    Smoke tests every entrant against a fast reference opponent before
+    the tournament is built, all in parallel. Agents are first given
+    quick_timeout per move; only those that time out are retried with the
+    full move timeout, so slow but working agents still qualify. Agents
+    that crash, play invalid moves or still time out are disqualified and
+    listed in self.failures.
+    '''
+    def __init__(self, timeout, opponent=REFERENCE_OPPONENT, quick_timeout=1, moves=4, jobs=None,
+                 limits=None):
+        self.timeout = timeout
+        self.opponent = opponent
+        self.quick_timeout = min(quick_timeout, timeout)
+        self.moves = moves
+        self.jobs = jobs if jobs and jobs > 1 else os.cpu_count()
+        self.limits = limits
+        self.failures = {}
+
+    def _run(self, executor, entrants, timeout):
+        futures = [executor.submit(qualify_agent, agent_str, self.opponent, timeout, self.moves, self.limits)
+                   for _, agent_str in entrants]
+        return {name: future.result() for (name, _), future in zip(entrants, futures)}
+
+    def __call__(self, entrants):
+        try:
+            canvasapi.load_agent_class(self.opponent)
+        except Exception as e:
+            print('Skipping qualification, reference opponent failed to load:', e)
+            return entrants
+
+        with ProcessPoolExecutor(max_workers=min(self.jobs, max(len(entrants), 1))) as executor:
+            results = self._run(executor, entrants, self.quick_timeout)
+            slow = [(name, agent_str) for name, agent_str in entrants
+                    if results[name] is not None and results[name][0] == 'timeout']
+            if slow and self.timeout > self.quick_timeout:
+                results.update(self._run(executor, slow, self.timeout))
+
+        for name, failure in results.items():
+            if failure is not None:
+                self.failures[name] = failure
+                print('Disqualified', name, failure)
+        return [(name, agent_str) for name, agent_str in entrants if name not in self.failures]
@@ -0,0 +1,28 @@
+from reference_agent import book, search
+
+class AIPlayer:
+    '''
+    Reference opponent for qualification, benchmarks and calibration.
+    Plays from the opening book while the position is in it, then runs an
+    iterative deepening negamax search for time_budget seconds. The
+    transposition table is kept between moves, so later searches reuse
+    the work of earlier ones.
+    '''
+    TIME_BUDGET = 0.1
+
+    def __init__(self, player_number, time_budget=None):
+        self.player_number = player_number
+        self.type = 'ai'
+        self.time_budget = self.TIME_BUDGET if time_budget is None else time_budget
+        self.searcher = search.Searcher()
+        self.book = book.load_book()
+
+    def get_alpha_beta_move(self, board):
+        position, mask = search.from_array(board, self.player_number)
+        move = book.lookup(self.book, position, mask)
+        if move is None:
+            move, _, _ = self.searcher.best_move(position, mask, self.time_budget)
+        return move
+
+    def get_expectimax_move(self, board):
+        return self.get_alpha_beta_move(board)
@@ -0,0 +1,93 @@
+import argparse
+import bisect
+import os
+import sys
+from array import array
+
+from board import COLUMNS
+from reference_agent import search
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.bin')
+
+# The book is a sorted array of little-endian uint64 entries, each
+# (key << 3) | column, where key is search.key of the position with the
+# player to move. Only the smaller of a position and its mirror image is
+# stored, so the book is half the size and is searched with bisect.
+MOVE_BITS = 3
+
+def canonical(position, mask):
+    '''Returns (key, mirrored) for the smaller of the position and its mirror image.'''
+    k = search.key(position, mask)
+    m = search.mirror(k)
+    return (m, True) if m < k else (k, False)
+
+def load_book(path=BOOK_PATH):
+    '''Returns the book as an array of entries, empty if there is no book file.'''
+    entries = array('Q')
+    try:
+        with open(path, 'rb') as f:
+            entries.frombytes(f.read())
+    except FileNotFoundError:
+        return entries
+    if entries.itemsize != 8:
+        raise ValueError('array Q is not 64 bits on this platform')
+    if sys.byteorder == 'big':
+        entries.byteswap()
+    return entries
+
+def lookup(entries, position, mask):
+    '''Returns the book column for the player to move, or None if the position is not in the book.'''
+    k, mirrored = canonical(position, mask)
+    i = bisect.bisect_left(entries, k << MOVE_BITS)
+    if i == len(entries) or entries[i] >> MOVE_BITS != k:
+        return None
+    col = entries[i] & ((1 << MOVE_BITS) - 1)
+    return COLUMNS - 1 - col if mirrored else col
+
+def positions(plies):
+    '''Yields every (position, mask) reachable in at most plies moves, up to mirroring.'''
+    seen = set()
+    frontier = [(0, 0)]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for position, mask in frontier:
+            k, _ = canonical(position, mask)
+            if k in seen:
+                continue
+            seen.add(k)
+            yield position, mask
+            if ply < plies:
+                next_frontier.extend(search.play(position, mask, col)
+                                     for col in range(COLUMNS) if search.can_play(mask, col))
+        frontier = next_frontier
+
+def generate(plies, depth, verbose=False):
+    '''Searches every position up to plies moves deep to depth and returns the sorted entries.'''
+    searcher = search.Searcher()
+    entries = array('Q')
+    for n, (position, mask) in enumerate(positions(plies)):
+        col, score, _ = searcher.best_move(position, mask, max_depth=depth)
+        k, mirrored = canonical(position, mask)
+        entries.append((k << MOVE_BITS) | (COLUMNS - 1 - col if mirrored else col))
+        if verbose:
+            print(n, search.popcount(mask), col, score)
+    return array('Q', sorted(entries))
+
+def write_book(entries, path=BOOK_PATH):
+    if sys.byteorder == 'big':
+        entries = array('Q', entries)
+        entries.byteswap()
+    with open(path + '.tmp', 'wb') as f:
+        entries.tofile(f)
+    os.replace(path + '.tmp', path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Builds the opening book for the reference agent')
+    parser.add_argument('--plies', type=int, default=4,
+                        help='Moves already played in the deepest book positions')
+    parser.add_argument('--depth', type=int, default=10,
+                        help='Search depth for every book position')
+    parser.add_argument('--output', default=BOOK_PATH)
+    args = parser.parse_args()
+
+    write_book(generate(args.plies, args.depth, verbose=True), args.output)
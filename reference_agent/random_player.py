@@ -0,0 +1,14 @@
+import random
+
+class AIPlayer:
+    '''
+    Plays a uniformly random legal column. Its type is 'random', so it
+    moves in the supervisor's process and its opponent is asked for
+    get_expectimax_move instead of get_alpha_beta_move.
+    '''
+    def __init__(self, player_number):
+        self.player_number = player_number
+        self.type = 'random'
+
+    def get_move(self, board):
+        return random.choice([col for col in range(board.shape[1]) if board[0, col] == 0])
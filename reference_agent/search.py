@@ -0,0 +1,166 @@
+import time
+
+from board import ROWS, COLUMNS, HEIGHT, has_four
+
+# Positions are (position, mask) pairs: position holds the stones of the
+# player to move and mask holds every stone, using the bit layout of
+# board.BitBoard. Playing a move flips position to the other player.
+BOTTOM = sum(1 << (col * HEIGHT) for col in range(COLUMNS))
+FULL = BOTTOM * ((1 << ROWS) - 1)
+COLUMN_MASKS = [((1 << ROWS) - 1) << (col * HEIGHT) for col in range(COLUMNS)]
+TOP_MASKS = [1 << (ROWS - 1 + col * HEIGHT) for col in range(COLUMNS)]
+BOTTOM_MASKS = [1 << (col * HEIGHT) for col in range(COLUMNS)]
+# Center columns first: they take part in the most lines.
+ORDER = sorted(range(COLUMNS), key=lambda col: abs(col - COLUMNS // 2))
+
+WIN = 1000
+EXACT, LOWER, UPPER = 0, 1, 2
+
+def from_array(board, player_number):
+    '''Builds (position, mask) for player_number to move from a 6x7 numpy board.'''
+    position = mask = 0
+    for col in range(COLUMNS):
+        for row in range(ROWS):
+            value = board[ROWS - 1 - row, col]
+            if value:
+                bit = 1 << (col * HEIGHT + row)
+                mask |= bit
+                if value == player_number:
+                    position |= bit
+    return position, mask
+
+def can_play(mask, col):
+    return not mask & TOP_MASKS[col]
+
+def play(position, mask, col):
+    return position ^ mask, mask | (mask + BOTTOM_MASKS[col])
+
+def move_bit(mask, col):
+    return (mask + BOTTOM_MASKS[col]) & COLUMN_MASKS[col]
+
+def is_winning_move(position, mask, col):
+    return has_four(position | move_bit(mask, col))
+
+def popcount(x):
+    return bin(x).count('1')
+
+def winning_cells(position, mask):
+    '''Empty cells that would complete four in a row for position.'''
+    p = position
+    r = (p << 1) & (p << 2) & (p << 3)
+    for s in (HEIGHT, HEIGHT - 1, HEIGHT + 1):
+        t = (p << s) & (p << 2 * s)
+        r |= t & (p << 3 * s)
+        r |= t & (p >> s)
+        t = (p >> s) & (p >> 2 * s)
+        r |= t & (p << s)
+        r |= t & (p >> 3 * s)
+    return r & (FULL ^ mask)
+
+def mirror(x):
+    '''Reflects a bitboard left to right.'''
+    out = 0
+    for col in range(COLUMNS):
+        out |= ((x >> (col * HEIGHT)) & ((1 << HEIGHT) - 1)) << ((COLUMNS - 1 - col) * HEIGHT)
+    return out
+
+def key(position, mask):
+    return position + mask
+
+class Searcher:
+    '''
+    Iterative deepening negamax with alpha-beta pruning and a
+    transposition table. Moves are ordered by the table's best move, then
+    by how many winning cells they create, then center first.
+    '''
+    def __init__(self, table_size=1 << 20):
+        self.table = {}
+        self.table_size = table_size
+        self.deadline = None
+        self.nodes = 0
+
+    def evaluate(self, position, mask):
+        opponent = position ^ mask
+        return popcount(winning_cells(position, mask)) - popcount(winning_cells(opponent, mask))
+
+    def ordered_moves(self, position, mask, best):
+        moves = [col for col in ORDER if can_play(mask, col)]
+        scores = {col: popcount(winning_cells(position | move_bit(mask, col), mask)) for col in moves}
+        moves.sort(key=lambda col: (col != best, -scores[col]))
+        return moves
+
+    def negamax(self, position, mask, moves_played, depth, alpha, beta):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and self.deadline is not None and time.perf_counter() > self.deadline:
+            raise TimeoutError()
+
+        for col in ORDER:
+            if can_play(mask, col) and is_winning_move(position, mask, col):
+                return WIN + (ROWS * COLUMNS - moves_played)
+        if moves_played >= ROWS * COLUMNS - 1:
+            return 0
+        if depth == 0:
+            return self.evaluate(position, mask)
+
+        k = key(position, mask)
+        entry = self.table.get(k)
+        best = None
+        if entry is not None:
+            entry_depth, value, flag, best = entry
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return value
+                if flag == LOWER and value >= beta:
+                    return value
+                if flag == UPPER and value <= alpha:
+                    return value
+
+        original_alpha = alpha
+        best_value = -2 * WIN
+        for col in self.ordered_moves(position, mask, best):
+            child_position, child_mask = play(position, mask, col)
+            value = -self.negamax(child_position, child_mask, moves_played + 1, depth - 1, -beta, -alpha)
+            if value > best_value:
+                best_value, best = value, col
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        if len(self.table) >= self.table_size:
+            self.table.clear()
+        flag = UPPER if best_value <= original_alpha else LOWER if best_value >= beta else EXACT
+        self.table[k] = (depth, best_value, flag, best)
+        return best_value
+
+    def best_move(self, position, mask, time_budget=None, max_depth=ROWS * COLUMNS):
+        '''
+        Returns (column, score, depth reached) for the player to move,
+        searching deeper until time_budget seconds have passed.
+        '''
+        moves_played = popcount(mask)
+        legal = [col for col in ORDER if can_play(mask, col)]
+        for col in legal:
+            if is_winning_move(position, mask, col):
+                return col, WIN, 0
+
+        self.deadline = None if time_budget is None else time.perf_counter() + time_budget
+        self.nodes = 0
+        choice, score, reached = legal[0], 0, 0
+        try:
+            for depth in range(1, min(max_depth, ROWS * COLUMNS - moves_played) + 1):
+                best_value, best_col = -3 * WIN, legal[0]
+                alpha = -3 * WIN
+                entry = self.table.get(key(position, mask))
+                for col in self.ordered_moves(position, mask, entry[3] if entry else None):
+                    child_position, child_mask = play(position, mask, col)
+                    value = -self.negamax(child_position, child_mask, moves_played + 1, depth - 1, -3 * WIN, -alpha)
+                    if value > best_value:
+                        best_value, best_col = value, col
+                    alpha = max(alpha, value)
+                self.table[key(position, mask)] = (depth, best_value, EXACT, best_col)
+                choice, score, reached = best_col, best_value, depth
+                if abs(best_value) >= WIN:
+                    break
+        except TimeoutError:
+            pass
+        return choice, score, reached
@@ -0,0 +1,182 @@
+import argparse
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from board import ROWS, COLUMNS, HEIGHT
+
+# Pool processes pick the archive path up from the environment, like the
+# event log.
+ENV_VAR = 'CODETOURNAMENT_REPLAY'
+
+# Every game is one self-contained record, appended with a single write:
+#   header   magic, version, winner, forfeit kind, number of moves,
+#            total think time of each player, move timeout, wall clock
+#   names    utf-8 agent strings of player 1 and player 2
+#   moves    one nibble per column, the first move in the low nibble,
+#            PASS for an agent that returned None and passed its turn
+#   think    float32 think time of every move, NaN for in-process players
+# Version 1 records had a one byte move count and no passes.
+MAGIC = b'C4'
+VERSION = 2
+HEADERS = {1: struct.Struct('<2sBBBBddfdHH'), 2: struct.Struct('<2sBBBHddfdHH')}
+HEADER = HEADERS[VERSION]
+PASS = 0xF
+FORFEITS = {None: 0, 'timeout': 1, 'error': 2}
+MAX_MOVES = ROWS * COLUMNS
+
+def configure(path):
+    if path is None:
+        os.environ.pop(ENV_VAR, None)
+    else:
+        os.environ[ENV_VAR] = os.path.abspath(path)
+
+def pack_moves(moves):
+    packed = bytearray((len(moves) + 1) // 2)
+    for i, col in enumerate(moves):
+        packed[i // 2] |= (PASS if col is None else col) << (4 * (i % 2))
+    return bytes(packed)
+
+def unpack_moves(packed, num_moves):
+    moves = [(packed[i // 2] >> (4 * (i % 2))) & 0xF for i in range(num_moves)]
+    return [None if col == PASS else col for col in moves]
+
+def encode(player1, player2, winner, forfeit, time1, time2, timeout, moves, think, ts=None):
+    name1, name2 = str(player1).encode('utf-8'), str(player2).encode('utf-8')
+    header = HEADER.pack(MAGIC, VERSION, winner, FORFEITS[forfeit], len(moves), time1, time2, timeout,
+                         time.time() if ts is None else ts, len(name1), len(name2))
+    think = np.array([np.nan if t is None else t for t in think], dtype='<f4')
+    return header + name1 + name2 + pack_moves(moves) + think.tobytes()
+
+def record(game, player1, player2):
+    '''
+    Appends a finished game to the configured archive. Does nothing when
+    no archive is configured.
+    '''
+    path = os.environ.get(ENV_VAR)
+    if path is None:
+        return
+    forfeit = game.error[1] if game.error is not None else None
+    data = encode(player1, player2, game.winner, forfeit, game.totaltimes[0], game.totaltimes[1],
+                  game.ai_turn_limit, [col for col, _ in game.moves], [think for _, think in game.moves])
+    with open(path, 'ab') as f:
+        f.write(data)
+
+def read(path):
+    '''Returns every game in the archive at path as a dict.'''
+    with open(path, 'rb') as f:
+        data = f.read()
+    kinds = {code: kind for kind, code in FORFEITS.items()}
+    games = []
+    offset = 0
+    while offset < len(data):
+        magic, version = data[offset:offset + 2], data[offset + 2] if offset + 2 < len(data) else None
+        if magic != MAGIC or version not in HEADERS:
+            raise ValueError('Corrupt replay archive {} at byte {}'.format(path, offset))
+        header = HEADERS[version]
+        (magic, version, winner, forfeit, num_moves, time1, time2, timeout, ts,
+         len1, len2) = header.unpack_from(data, offset)
+        offset += header.size
+        player1 = data[offset:offset + len1].decode('utf-8')
+        player2 = data[offset + len1:offset + len1 + len2].decode('utf-8')
+        offset += len1 + len2
+        moves = unpack_moves(data[offset:offset + (num_moves + 1) // 2], num_moves)
+        offset += (num_moves + 1) // 2
+        think = np.frombuffer(data, dtype='<f4', count=num_moves, offset=offset)
+        offset += 4 * num_moves
+        games.append({'player1': player1, 'player2': player2, 'winner': winner, 'forfeit': kinds[forfeit],
+                      'time1': time1, 'time2': time2, 'timeout': timeout, 'ts': ts,
+                      'moves': moves, 'think': think})
+    return games
+
+def has_four(masks):
+    '''board.has_four over an array of uint64 bitboards.'''
+    found = np.zeros(masks.shape, dtype=bool)
+    for shift in (1, HEIGHT, HEIGHT - 1, HEIGHT + 1):
+        m = masks & (masks >> np.uint64(shift))
+        found |= (m & (m >> np.uint64(2 * shift))) != 0
+    return found
+
+def verify(games):
+    '''
+    Replays every game with the referee rules, all games at once one ply
+    at a time, and returns (expected winners, reasons). A pass takes a
+    ply without dropping a piece. A reason is None when the recorded
+    moves are consistent, otherwise it says what is wrong with the
+    record. No agent code is run.
+    '''
+    n = len(games)
+    lengths = np.array([len(g['moves']) for g in games], dtype=np.int64)
+    width = max(int(lengths.max()), 1) if n else 1
+    moves = np.zeros((n, width), dtype=np.int64)
+    moves[np.arange(width) < lengths[:, None]] = [PASS if col is None else col
+                                                  for g in games for col in g['moves']]
+
+    games_idx = np.arange(n)
+    masks = np.zeros((2, n), dtype=np.uint64)
+    heights = np.zeros((n, COLUMNS), dtype=np.int64)
+    first_win = np.full(n, -1, dtype=np.int64)
+    full_at = np.full(n, -1, dtype=np.int64)
+    illegal = np.zeros(n, dtype=bool)
+    for ply in range(width):
+        active = (ply < lengths) & ~illegal
+        if not active.any():
+            break
+        col = np.where(active, moves[:, ply], PASS)
+        drop = active & (col != PASS)
+        illegal |= drop & (col >= COLUMNS)
+        col = np.minimum(col, COLUMNS - 1)
+        row = heights[games_idx, col]
+        illegal |= drop & (row >= ROWS)
+        ok = drop & ~illegal
+        bit = np.uint64(1) << (col * HEIGHT + np.minimum(row, ROWS - 1)).astype(np.uint64)
+        masks[ply % 2] |= np.where(ok, bit, np.uint64(0))
+        heights[games_idx, col] += ok
+        first_win[ok & (first_win < 0) & has_four(masks[ply % 2])] = ply
+        full_at[ok & (full_at < 0) & (heights.sum(axis=1) == MAX_MOVES)] = ply
+
+    forfeit = np.array([g['forfeit'] is not None for g in games], dtype=bool)
+    slower = np.array([g['time1'] > g['time2'] for g in games], dtype=bool)
+    won = first_win >= 0
+    full = full_at >= 0
+    expected = np.select(
+        [won, forfeit, full],
+        # The last mover made four; the player to move forfeited; on a
+        # full board the player with less total think time wins.
+        [(lengths - 1) % 2 + 1, 2 - lengths % 2, np.where(slower, 2, 1)],
+        0)
+    reasons = np.select(
+        [illegal, won & (first_win != lengths - 1), won & forfeit, ~won & full & (full_at != lengths - 1),
+         ~won & ~forfeit & ~full],
+        ['illegal move', 'moves after a win', 'forfeit after a win', 'moves after a full board',
+         'game did not finish'],
+        '')
+    return expected, [reason or None for reason in reasons.tolist()]
+
+def audit(paths):
+    '''Verifies every archive in paths and returns the games whose recorded result does not hold up.'''
+    games = [g for path in paths for g in read(path)]
+    if not games:
+        return games, []
+    expected, reasons = verify(games)
+    disputed = []
+    for g, winner, reason in zip(games, expected.tolist(), reasons):
+        if reason is not None or winner != g['winner']:
+            disputed.append(dict(g, expected=winner, reason=reason or 'winner differs'))
+    return games, disputed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks the winner of every game in replay archives')
+    parser.add_argument('archives', nargs='+')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    games, disputed = audit(args.archives)
+    for g in disputed:
+        print('{} vs {}: recorded winner {}, replay gives {} ({})'.format(
+            g['player1'], g['player2'], g['winner'], g['expected'], g['reason']))
+    print('{} games checked in {:.2f}s, {} disputed'.format(len(games), time.perf_counter() - start, len(disputed)))
+    sys.exit(1 if disputed else 0)
@@ -1,193 +1,68 @@
 # system libs
 import argparse
-import multiprocessing as mp
 import time
 import os
 import shutil
 import json
-import boto3
-from copy import deepcopy
-
-# 3rd party libs
-import numpy as np
+from functools import partial
 
 # Local libs
 import canvasapi
 from bracket import Bracket
-
-#https://stackoverflow.com/a/37737985
-def turn_worker(board, send_end, p_func, returnqueue):
+import bracketview
+from tournament import Swiss
+from cache import MatchCache, CachedGame
+from agents import AgentRegistry
+from journal import Journal
+from bestof import BestOf
+from game import setup_game, game_result
+from qualify import Qualifier
+from supervisor import AsyncSupervisor
+import events
+import replay
+import storage
+import sandbox
+
+def seeding_key(coursenum, timeout):
+    return 'cse'+str(coursenum)+'_'+str(timeout)+'sec'
+
+def get_json(coursenum, timeout, store=None):
+    store = store or storage.default_storage()
     try:
-        start = time.perf_counter()
-        send_end.send(p_func(board))
-        end = time.perf_counter()
-        returnqueue.put(end - start)
-    except:
-        returnqueue.put(-1)
-        
-
-
-class Game:
-    def __init__(self, player1, player2, timeout):
-        self.players = [player1, player2]
-        self.colors = ['yellow', 'red']
-        self.current_turn = 0
-        self.board = np.zeros([6,7]).astype(np.uint8)
-        self.gui_board = []
-        self.game_over = False
-        self.ai_turn_limit = timeout
-        self.winner = 0
-        self.totaltimes = [0, 0]
-
-    def make_move(self):
-        if not self.game_over:
-            current_player = self.players[self.current_turn]
-            if current_player.type == 'ai':
-                
-                if self.players[int(not self.current_turn)].type == 'random':
-                    p_func = current_player.get_expectimax_move
-                else:
-                    p_func = current_player.get_alpha_beta_move
-                
-                try:
-                    recv_end, send_end = mp.Pipe(False)
-                    queue = mp.Queue()
-                    p = mp.Process(target=turn_worker, args=(deepcopy(self.board), send_end, p_func, queue))
-                    p.start()
-                    if p.join(self.ai_turn_limit) is None and p.is_alive():
-                        p.terminate()
-                        raise Exception('Player Exceeded time limit')
-                    turntime = queue.get(timeout=self.ai_turn_limit)
-                    if (turntime < 0):
-                        raise Exception()
-                    print(current_player.player_number, turntime)
-                    self.totaltimes[self.current_turn] += turntime
-                    # print('Turn time:', end - start)
-                except Exception as e:
-                    uh_oh = 'Uh oh.... something is wrong with Player {}'
-                    print(uh_oh.format(current_player.player_number))
-                    print(e)
-                    
-                    self.winner = 3 - current_player.player_number
-                    self.game_over = True
-                    return
-                    # raise Exception('Game Over')
-
-                move = recv_end.recv()
-            else:
-                move = current_player.get_move(self.board)
-
-            if move is not None:
-                try:
-                    self.update_board(int(move), current_player.player_number)
-                except Exception as e:
-                    print ('Error updating board. Most likely move is invalid. Player ', current_player.player_number)
-                    print (e)
-                    self.winner = 3 - current_player.player_number
-                    self.game_over = True
-                    return
-
-            if self.game_completed(current_player.player_number):
-                self.winner = current_player.player_number
-                self.game_over = True
-                # self.player_string.configure(text=self.players[self.current_turn].player_string + ' wins!')
-            else:
-                self.current_turn = int(not self.current_turn)
-                # self.player_string.configure(text=self.players[self.current_turn].player_string)
-
-    def update_board(self, move, player_num):
-        if 0 in self.board[:,move]:
-            update_row = -1
-            for row in range(1, self.board.shape[0]):
-                update_row = -1
-                if self.board[row, move] > 0 and self.board[row-1, move] == 0:
-                    update_row = row-1
-                elif row==self.board.shape[0]-1 and self.board[row, move] == 0:
-                    update_row = row
-
-                if update_row >= 0:
-                    self.board[update_row, move] = player_num
-                    # self.c.itemconfig(self.gui_board[move][update_row],
-                    #                   fill=self.colors[self.current_turn])
-                    break
-        else:
-            err = 'Invalid move by player {}. Column {}'.format(player_num, move)
-            raise Exception(err)
-
-
-    def game_completed(self, player_num):
-        player_win_str = '{0}{0}{0}{0}'.format(player_num)
-        board = self.board
-        to_str = lambda a: ''.join(a.astype(str))
-
-        def check_horizontal(b):
-            for row in b:
-                if player_win_str in to_str(row):
-                    return True
-            return False
-
-        def check_verticle(b):
-            return check_horizontal(b.T)
-
-        def check_diagonal(b):
-            for op in [None, np.fliplr]:
-                op_board = op(b) if op else b
-                
-                root_diag = np.diagonal(op_board, offset=0).astype(np.int)
-                if player_win_str in to_str(root_diag):
-                    return True
-
-                for i in range(1, b.shape[1]-3):
-                    for offset in [i, -i]:
-                        diag = np.diagonal(op_board, offset=offset)
-                        diag = to_str(diag.astype(np.int))
-                        if player_win_str in diag:
-                            return True
-
-            return False
-
-        return (check_horizontal(board) or
-                check_verticle(board) or
-                check_diagonal(board))
-
-def get_json(coursenum, timeout):
-    try:
-        with open('3/aws-secret-access-key', 'r') as asak, open('2/aws-access-key-id', 'r') as aaki:
-            session = boto3.Session(aws_secret_access_key=asak.read().strip(), aws_access_key_id = aaki.read().strip())
-            s3 = session.resource('s3')
-            client = session.client('s3', endpoint_url='https://s3.nautilus.optiputer.net')
-
-            
-            val = client.get_object(Bucket='connect4', Key='cse'+str(coursenum)+'_'+str(timeout)+'sec')
-            if val['ResponseMetadata']['HTTPStatusCode'] == 200:
-                return eval(val['Body'].read().decode('utf-8'))
-            else:
-                return None
+        text = store.get_text(seeding_key(coursenum, timeout))
+        return None if text is None else json.loads(text)
     except Exception as e:
         print ('Error getting json:')
         print (e)
-        print ('Response:')
-        print (val)
         return None
 
-def put_json(seedinglist, coursenum, timeout):
+def put_json(seedinglist, coursenum, timeout, store=None):
+    store = store or storage.default_storage()
     try:
-        with open('3/aws-secret-access-key', 'r') as asak, open('2/aws-access-key-id', 'r') as aaki:
-            session = boto3.Session(aws_secret_access_key=asak.read().strip(), aws_access_key_id = aaki.read().strip())
-            s3 = session.resource('s3')
-            client = session.client('s3', endpoint_url='https://s3.nautilus.optiputer.net')
-
-            jsondata = json.dumps(seedinglist)
-
-            val = client.put_object(Body=jsondata, Bucket='connect4', Key='cse'+str(coursenum)+'_'+str(timeout)+'sec')
+        store.put_text(seeding_key(coursenum, timeout), json.dumps(seedinglist))
     except Exception as e:
         print ('Error putting json:')
         print (e)
-        print ('Response:')
-        print (val)
         return None
 
-def generate_bracket(time, seeding):
+def get_journal(coursenum, timeout, store=None):
+    store = store or storage.default_storage()
+    try:
+        return store.get_text(seeding_key(coursenum, timeout) + '_journal')
+    except Exception as e:
+        print ('Error getting journal:')
+        print (e)
+        return None
+
+def put_journal(journaltext, coursenum, timeout, store=None):
+    store = store or storage.default_storage()
+    try:
+        store.put_text(seeding_key(coursenum, timeout) + '_journal', journaltext)
+    except Exception as e:
+        print ('Error putting journal:')
+        print (e)
+
+def generate_bracket(time, seeding, fmt='bracket', rounds=None, registry=None, qualifier=None):
     submission_folders = os.listdir('./submissions')
     if len(submission_folders) == 0:
         return None
@@ -208,6 +83,15 @@ def generate_bracket(time, seeding):
     
     submission_pairs = list(zip(submission_folders, submission_import_strings))
     submission_pairs_cleaned = [x for x in submission_pairs if x[1] is not None]
+    if registry is not None:
+        submission_pairs_cleaned = registry.validate(submission_pairs_cleaned)
+    if qualifier is not None:
+        submission_pairs_cleaned = qualifier(submission_pairs_cleaned)
+    if registry is not None or qualifier is not None:
+        if len(submission_pairs_cleaned) == 0:
+            return None
+        elif len(submission_pairs_cleaned) == 1:
+            return [submission_pairs_cleaned[0][0]]
 
     print('Submission name/file pairs:')
     print(submission_pairs_cleaned)
@@ -230,36 +114,34 @@ def generate_bracket(time, seeding):
 
         submission_pairs_cleaned = seeded_pairs + nonseeded_pairs
     print('players:', submission_pairs_cleaned)
-    return Bracket(submission_pairs_cleaned, time)
-
-def run_game(player1, player2, timeout):
-    if (player1 is None):
-        return 2, float('inf'), 0
-    elif (player2 is None):
-        return 1, 0, float('inf')
+    return make_tournament(submission_pairs_cleaned, time, fmt, rounds)
+
+def make_tournament(teams, time, fmt='bracket', rounds=None):
+    '''Builds a Bracket, or a Swiss for the swiss and roundrobin formats, from (name, agent_str) teams.'''
+    if fmt == 'bracket':
+        return Bracket(teams, time)
+    return Swiss(teams, time, rounds, roundrobin=(fmt == 'roundrobin'))
+
+def run_game(player1, player2, timeout, limits=None):
+    start = time.perf_counter()
+    game, result = setup_game(player1, player2, timeout, limits)
+    if game is None:
+        return result
     try:
-        p1 = canvasapi.import_agent(player1, 1)
-    except Exception as e:
-        print (e, player1)
-        return 2, float('inf'), 0
-    try:    
-        p2 = canvasapi.import_agent(player2, 2)
-    except Exception as e:
-        print (e, player2)
-        return 1, 0, float('inf')
-    game = Game(p1, p2, timeout)
-    while (not game.game_over):
-        # Check for and handle tie
-        if np.count_nonzero(game.board) == (game.board.shape[0] * game.board.shape[1]) and game.winner == 0:
-            game.winner = 2 if game.totaltimes[0] > game.totaltimes[1] else 1
-            break
-            
-        game.make_move()
+        while (not game.game_over):
+            # Check for and handle tie
+            if game.check_tie():
+                break
+                
+            game.make_move()
+    finally:
+        game.close()
     
-    print(game.totaltimes[0], game.totaltimes[1])
-    return game.winner, game.totaltimes[0], game.totaltimes[1]
+    return game_result(game, player1, player2, start)
 
-def main(coursenum, timeout, putnone):
+def main(coursenum, timeout, putnone, jobs=1, fmt='bracket', rounds=None, usecache=True, eventlog=None,
+         resume=False, bestof=1, supervisor='process', storagedir=None, limits=None, qualify=True,
+         live=None, export=None):
     """
     Creates player objects based on the string paramters that are passed
     to it and calls play_game()
@@ -269,21 +151,86 @@ def main(coursenum, timeout, putnone):
     player2 - a string ['ai', 'random', 'human']
     """
 
-    seeding = get_json(coursenum, timeout)
+    events.configure(eventlog)
+    replay.configure('replay_cse{}_{}sec.bin'.format(coursenum, timeout))
+    store = storage.FileStorage(storagedir) if storagedir else storage.default_storage()
+    seeding = get_json(coursenum, timeout, store)
     print('seeding:', seeding)
     
-    b = generate_bracket(timeout, seeding)
-    if b is not None and type(b) is Bracket:
-        b.evalBracket(run_game)
+    cache = MatchCache() if usecache else None
+
+    journalpath = 'journal_cse{}_{}sec.jsonl'.format(coursenum, timeout)
+    if resume and not os.path.exists(journalpath) and not putnone:
+        journaltext = get_journal(coursenum, timeout, store)
+        if journaltext is not None:
+            with open(journalpath, 'w') as f:
+                f.write(journaltext)
+    header = Journal(journalpath).header() if resume else None
+    if header is not None:
+        # Validation and qualification depend on timing, so a resumed run
+        # keeps the entrants the journal was started with.
+        print('Resuming with the entrants recorded in', journalpath)
+        b = make_tournament([tuple(team) for team in header['teams']], timeout, fmt, rounds)
+    else:
+        qualifier = None
+        if qualify:
+            qualifier = Qualifier(timeout, jobs=jobs, limits=limits)
+        b = generate_bracket(timeout, seeding, fmt, rounds, AgentRegistry(jobs=jobs), qualifier)
+    if b is not None and type(b) in (Bracket, Swiss):
+        mirror = None if putnone else lambda text: put_journal(text, coursenum, timeout, store)
+        journal = Journal(journalpath, mirror)
+        journal.start({'format': fmt, 'timeout': timeout, 'rounds': rounds, 'bestof': bestof,
+                       'teams': b.teams}, resume)
+
+        async_supervisor = None
+        executor = None
+        game = run_game if limits is None else partial(run_game, limits=limits)
+        if supervisor == 'async':
+            async_supervisor = AsyncSupervisor(limits=limits, max_games=jobs if jobs > 1 else None)
+            executor = game = async_supervisor
+        if bestof > 1:
+            game = BestOf(game, bestof)
+        if usecache:
+            tags = []
+            if bestof > 1:
+                tags.append('bestof{}'.format(bestof))
+            if limits is not None:
+                tags.append('sandbox{}_{}_{}'.format(limits.cpu_time, limits.memory, limits.processes))
+            game = CachedGame(game, cache, ','.join(tags) or None)
+
+        view = bracketview.BracketView(b, live) if live is not None and type(b) is Bracket else None
+        try:
+            if type(b) is Swiss:
+                b.evalTournament(game, jobs, journal, executor)
+            else:
+                b.evalBracket(game, jobs, journal, executor, view.update if view is not None else None)
+        finally:
+            journal.close()
+            if view is not None:
+                view.write()
+            if async_supervisor is not None:
+                async_supervisor.close()
+        if cache is not None:
+            cache.evict()
         placings = b.getPlacings()
         print(placings)
+        records = events.read(eventlog, events.run_id()) if eventlog is not None and os.path.exists(eventlog) else []
+        if eventlog is not None:
+            events.print_summary(events.summarize(records))
+        if export is not None:
+            if eventlog is None:
+                print('--export without --events has no per move timings')
+            if type(b) is Bracket:
+                bracketview.export(b, export, records)
+            else:
+                print('--export only applies to brackets')
         if not putnone:
-            put_json(placings, coursenum, timeout)
+            put_json(placings, coursenum, timeout, store)
     elif b is not None and type(b) is list:
         # print('Only 1 entrant.')
         print(b)
         if not putnone:
-            put_json(b, coursenum, timeout)
+            put_json(b, coursenum, timeout, store)
     else:
         print('Less than two entrants, no bracket run')
 
@@ -297,6 +244,48 @@ if __name__=='__main__':
                         type=int,
                         default=5,
                         help='Time to wait for a move in seconds (int)')
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of matches to play at once (int)')
+    parser.add_argument('--format',
+                        choices=['bracket', 'swiss', 'roundrobin'],
+                        default='bracket',
+                        help='Tournament format')
+    parser.add_argument('--rounds',
+                        type=int,
+                        default=None,
+                        help='Number of swiss rounds (int)')
+    parser.add_argument('--bestof',
+                        type=int,
+                        default=1,
+                        help='Games per pairing, colors alternating (int)')
+    parser.add_argument('--no-cache', dest='usecache', action='store_false',
+                        help='Replay every match instead of reusing cached results')
+    parser.add_argument('--events',
+                        default=None,
+                        help='Append per-move and per-match events to this jsonl file')
+    parser.add_argument('--resume', dest='resume', action='store_true',
+                        help='Continue an interrupted run from its journal')
+    parser.add_argument('--supervisor',
+                        choices=['process', 'async'],
+                        default='process',
+                        help='Play --jobs matches on a process pool, or drive them all from one asyncio loop')
+    parser.add_argument('--storage',
+                        default=None,
+                        help='Keep seeding and journals in this directory instead of S3')
+    parser.add_argument('--sandbox', dest='sandbox', action='store_true',
+                        help='Limit agent cpu time per move, memory and process creation')
+    parser.add_argument('--memory',
+                        type=int,
+                        default=1024,
+                        help='Memory in MB each agent may use with --sandbox (int)')
+    parser.add_argument('--no-qualify', dest='qualify', action='store_false',
+                        help='Skip smoke testing agents against the reference opponent')
+    parser.add_argument('--live', default=None,
+                        help='File to keep the bracket drawn in while it is played')
+    parser.add_argument('--export', default=None,
+                        help='Write the match tree to this .json or .html file, with per move timings from --events')
     parser.add_argument('--delsubs', dest='delsubs', action='store_true')
     parser.add_argument('--getnone', dest='getnone', action='store_true')
     parser.add_argument('--putnone', dest='putnone', action='store_true')
@@ -312,4 +301,7 @@ if __name__=='__main__':
                 shutil.rmtree('./submissions')
             canvasapi.get_submissions(coursenumber, assignmentnumber, token.read().strip())#, dest_path='./' + str(args.course) + 'submissions')
         
-    main(args.course, args.time, args.putnone)
+    main(args.course, args.time, args.putnone, args.jobs, args.format, args.rounds, args.usecache, args.events,
+         args.resume, args.bestof, args.supervisor, args.storage,
+         sandbox.Limits(args.time, args.memory * 1024 * 1024, 0) if args.sandbox else None,
+         args.qualify, args.live, args.export)
@@ -0,0 +1,57 @@
+import math
+import os
+import resource
+import time
+
+class Limits:
+    '''
+    Resource limits for an agent process. None leaves a limit off.
+        cpu_time  - cpu seconds allowed per move (rounded up to whole
+                    seconds, the granularity of RLIMIT_CPU)
+        memory    - bytes of address space the agent may add on top of
+                    what the process already uses when it starts
+        processes - processes or threads the agent may start; 0 forbids
+                    both (ignored by the kernel when running as root)
+    '''
+    def __init__(self, cpu_time=None, memory=None, processes=None):
+        self.cpu_time = cpu_time
+        self.memory = memory
+        self.processes = processes
+
+def address_space():
+    '''Returns the current virtual size of this process in bytes, or 0 if unknown.'''
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def apply_limits(limits):
+    '''Called once in the agent process before the agent first moves.'''
+    if limits is None:
+        return
+    # Numeric libraries loaded from here on should not start thread pools.
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = '1'
+    if limits.memory is not None:
+        limit = address_space() + limits.memory
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if limits.processes is not None:
+        resource.setrlimit(resource.RLIMIT_NPROC, (limits.processes, limits.processes))
+
+def cpu_time():
+    return time.process_time()
+
+def start_move(limits):
+    '''
+    Lets the coming move use at most limits.cpu_time more cpu seconds.
+    A process over its RLIMIT_CPU soft limit is killed by SIGXCPU, which
+    the supervisor sees as the agent crashing.
+    '''
+    if limits is None or limits.cpu_time is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(math.ceil(cpu_time() + limits.cpu_time))
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
@@ -0,0 +1,99 @@
+import json
+import os
+
+import boto3
+from botocore.exceptions import ClientError
+
+class S3Storage:
+    '''
+    Reads and writes text objects in the S3 bucket. The client is created
+    once and reused. Objects read are kept in cache_dir together with
+    their ETag, so a later read of an unchanged object is answered with a
+    304 from S3 instead of downloading the body again.
+    '''
+    def __init__(self, bucket='connect4', endpoint_url='https://s3.nautilus.optiputer.net',
+                 secret_path='3/aws-secret-access-key', key_id_path='2/aws-access-key-id',
+                 cache_dir='./.storagecache'):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.secret_path = secret_path
+        self.key_id_path = key_id_path
+        self.cache_dir = cache_dir
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            with open(self.secret_path, 'r') as asak, open(self.key_id_path, 'r') as aaki:
+                session = boto3.Session(aws_secret_access_key=asak.read().strip(), aws_access_key_id = aaki.read().strip())
+            self._client = session.client('s3', endpoint_url=self.endpoint_url)
+        return self._client
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def _read_cache(self, key):
+        try:
+            with open(self._cache_path(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, key, etag, text):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self._cache_path(key) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'etag': etag, 'body': text}, f)
+        os.replace(tmp, self._cache_path(key))
+
+    def get_text(self, key):
+        '''Returns the object stored under key, or None if there is none.'''
+        cached = self._read_cache(key)
+        kwargs = {'IfNoneMatch': cached['etag']} if cached else {}
+        try:
+            val = self.client.get_object(Bucket=self.bucket, Key=key, **kwargs)
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if cached and code in ('304', 'NotModified'):
+                return cached['body']
+            if code in ('404', 'NoSuchKey'):
+                return None
+            raise
+        text = val['Body'].read().decode('utf-8')
+        self._write_cache(key, val['ETag'], text)
+        return text
+
+    def put_text(self, key, text):
+        val = self.client.put_object(Body=text, Bucket=self.bucket, Key=key)
+        self._write_cache(key, val['ETag'], text)
+
+class FileStorage:
+    '''
+    Stands in for S3Storage by keeping every object as a file under root,
+    so runs and tests work offline.
+    '''
+    def __init__(self, root):
+        self.root = root
+
+    def get_text(self, key):
+        try:
+            with open(os.path.join(self.root, key), 'r') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put_text(self, key, text):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, key)
+        with open(path + '.tmp', 'w') as f:
+            f.write(text)
+        os.replace(path + '.tmp', path)
+
+_default = None
+
+def default_storage():
+    '''Returns the shared S3Storage, created on first use.'''
+    global _default
+    if _default is None:
+        _default = S3Storage()
+    return _default
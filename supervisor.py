@@ -0,0 +1,117 @@
+import asyncio
+import multiprocessing as mp
+import os
+import threading
+import time
+
+from game import TurnTimeout, setup_game, game_result
+
+# Agent processes are started from a single threaded fork server. Forking
+# the supervisor itself while its loop and executor threads are busy
+# could leave a child holding a lock that is never released.
+CONTEXT = mp.get_context('forkserver')
+CONTEXT.set_forkserver_preload(['game'])
+
+async def wait_readable(conn, timeout):
+    '''Waits up to timeout seconds for conn to have data, without blocking the loop.'''
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    fd = conn.fileno()
+    loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+    try:
+        await asyncio.wait_for(ready, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(fd)
+
+async def make_move(game, semaphore):
+    '''
+    Async version of Game.make_move. The semaphore caps how many agents
+    compute at once, and the move deadline only starts once the agent has
+    a slot, so waiting for a slot never counts against the agent.
+    '''
+    p_func = game.move_function()
+    if p_func is None:
+        game.make_move()
+        return
+
+    loop = asyncio.get_running_loop()
+    worker = game.workers[game.current_turn]
+    if worker.needs_restart():
+        # Starting and stopping a process blocks, so it is kept off the loop.
+        await loop.run_in_executor(None, worker.restart)
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            worker.send(p_func)
+            if not await wait_readable(worker.conn, game.ai_turn_limit):
+                worker.kill()
+                await loop.run_in_executor(None, worker.stop)
+                raise TurnTimeout('Player Exceeded time limit')
+            move, turntime, rss, cputime = worker.receive()
+        except Exception as e:
+            game.forfeit(e, start)
+            return
+    game.apply_move(move, turntime, rss, start, cputime)
+
+async def play_game(player1, player2, timeout, semaphore, limits=None):
+    '''
+    Async version of runner.run_game, with the same results. Starting and
+    stopping the agent processes runs on the loop's executor so it does
+    not hold up the moves of other games.
+    '''
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    game, result = await loop.run_in_executor(None, setup_game, player1, player2, timeout, limits, CONTEXT)
+    if game is None:
+        return result
+    try:
+        while not game.game_over:
+            if game.check_tie():
+                break
+            await make_move(game, semaphore)
+    finally:
+        await loop.run_in_executor(None, game.close)
+    return game_result(game, player1, player2, start)
+
+class AsyncSupervisor:
+    '''
+    Runs one asyncio event loop on a background thread that drives every
+    game of a tournament. Passed to Bracket or Swiss as their executor,
+    a whole round is handed to the loop at once: submit schedules a
+    coroutine function on the loop and returns a concurrent future, and
+    play_async plays a game, so CachedGame and BestOf can wrap it. At
+    most limit agents compute at the same time and at most max_games
+    games are in flight, each under the sandbox limits.
+    '''
+    runs_coroutines = True
+
+    def __init__(self, limit=None, limits=None, max_games=None):
+        self.limit = limit or os.cpu_count()
+        self.limits = limits
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.semaphore, self.games = self._call(self._make_semaphores(max_games))
+
+    async def _make_semaphores(self, max_games):
+        return asyncio.Semaphore(self.limit), asyncio.Semaphore(max_games) if max_games else None
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def submit(self, fn, *args):
+        return asyncio.run_coroutine_threadsafe(fn(*args), self.loop)
+
+    async def play_async(self, player1, player2, timeout):
+        if self.games is None:
+            return await play_game(player1, player2, timeout, self.semaphore, self.limits)
+        async with self.games:
+            return await play_game(player1, player2, timeout, self.semaphore, self.limits)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
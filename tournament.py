@@ -0,0 +1,149 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+from bracket import play_matches
+
+def expected_score(rating_a, rating_b):
+    return 1 / (1 + 10 ** ((rating_b - rating_a) / 400))
+
+class Swiss:
+    '''
+    Ranks every entrant from many games instead of a single elimination
+    run. Each round pairs players with similar scores (or everyone in turn
+    with roundrobin=True) and every pairing is played twice so both
+    players get to move first. Ratings are updated with Elo after every
+    game.
+    '''
+    def __init__(self, teams, time, rounds=None, roundrobin=False, k=32, initial_rating=1500):
+        self.timeout = time
+        self.teams = list(teams)
+        self.players = [team[0] for team in teams]
+        self.agents = dict(teams)
+        self.seeds = {name: i for i, name in enumerate(self.players)}
+        self.roundrobin = roundrobin
+        self.k = k
+        self.ratings = {name: initial_rating for name in self.players}
+        self.scores = {name: 0 for name in self.players}
+        self.totaltimes = {name: 0 for name in self.players}
+        self.played = set()
+        self.byes = set()
+        self.numTeams = len(teams)
+        if roundrobin:
+            self.numRounds = self.numTeams - 1 if self.numTeams % 2 == 0 else self.numTeams
+        elif rounds:
+            self.numRounds = rounds
+        else:
+            self.numRounds = int(math.ceil(math.log(self.numTeams, 2)))
+
+    def standings(self):
+        return sorted(self.players,
+                      key=lambda p: (-self.scores[p], -self.ratings[p], self.seeds[p]))
+
+    def _roundRobinPairings(self, round_num):
+        # Circle method: the first player stays put, everyone else rotates.
+        players = self.players + ([None] if self.numTeams % 2 else [])
+        rest = players[1:]
+        shift = round_num % len(rest)
+        players = [players[0]] + rest[-shift:] + rest[:-shift] if shift else players
+        half = len(players) // 2
+        return [(players[i], players[-1 - i]) for i in range(half)]
+
+    def _swissPairings(self, round_num):
+        if round_num == 0:
+            # Fold the seeding so the top half meets the bottom half.
+            order = list(self.players)
+        else:
+            order = self.standings()
+
+        pairings = []
+        if len(order) % 2:
+            for player in reversed(order):
+                if player not in self.byes:
+                    break
+            order.remove(player)
+            pairings.append((player, None))
+
+        if round_num == 0:
+            half = len(order) // 2
+            return pairings + list(zip(order[:half], order[half:]))
+
+        while order:
+            player = order.pop(0)
+            opponent = next((o for o in order if frozenset((player, o)) not in self.played), order[0])
+            order.remove(opponent)
+            pairings.append((player, opponent))
+        return pairings
+
+    def _recordGame(self, player1, player2, result):
+        win_index, time1, time2 = result
+        if win_index not in (1, 2):
+            raise ValueError('Winner was neither 1 or 2')
+        score1 = 1 if win_index == 1 else 0
+        expected1 = expected_score(self.ratings[player1], self.ratings[player2])
+        self.ratings[player1] += self.k * (score1 - expected1)
+        self.ratings[player2] -= self.k * (score1 - expected1)
+        self.scores[player1] += score1
+        self.scores[player2] += 1 - score1
+        self.totaltimes[player1] += time1
+        self.totaltimes[player2] += time2
+
+    def _evalRound(self, round_num, game, executor=None, journal=None):
+        if self.roundrobin:
+            pairings = self._roundRobinPairings(round_num)
+        else:
+            pairings = self._swissPairings(round_num)
+
+        games = []
+        for a, b in pairings:
+            if a is None or b is None:
+                bye = a if b is None else b
+                print(bye, 'Bye')
+                self.byes.add(bye)
+                self.scores[bye] += 2
+                continue
+            print(a, b)
+            self.played.add(frozenset((a, b)))
+            games.append((a, b))
+            games.append((b, a))
+
+        # Ratings depend on the order games are recorded in, so results
+        # are applied in pairing order once the whole round is known.
+        results = {}
+        keys = ['{}:{}:{}'.format(round_num, a, b) for a, b in games]
+        remaining = []
+        for key, pair in zip(keys, games):
+            if journal is not None and key in journal.results:
+                results[key] = journal.results[key]
+            else:
+                remaining.append((key, pair))
+
+        def record(index, result):
+            key = remaining[index][0]
+            results[key] = result
+            if journal is not None:
+                journal.record(key, result)
+
+        agent_pairings = [(self.agents[a], self.agents[b]) for _, (a, b) in remaining]
+        play_matches(game, agent_pairings, self.timeout, executor, round_num + 1, record)
+        for key, (a, b) in zip(keys, games):
+            self._recordGame(a, b, results[key])
+
+    def evalTournament(self, game, jobs=1, journal=None, executor=None):
+        '''
+        Plays every round. Games within a round are independent, so with
+        jobs > 1 they run on a pool of processes, or on executor if one is
+        given. Results are written to journal as they finish, and games
+        already in it are not replayed.
+        '''
+        owned = executor is None and jobs > 1
+        if owned:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+        try:
+            for i in range(self.numRounds):
+                self._evalRound(i, game, executor, journal)
+        finally:
+            if owned:
+                executor.shutdown()
+
+    def getPlacings(self):
+        return self.standings()